@@ -0,0 +1,9 @@
+# the API lives next to the CLI in __main__, it only gets imported on first use so `python -m deew` doesn't load it twice
+__all__ = ['Job', 'JobResult', 'PlanError', 'plan', 'run']
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        from deew import __main__
+        return getattr(__main__, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
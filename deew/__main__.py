@@ -3,39 +3,45 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import csv
+import hashlib
+import heapq
+import importlib.util
+import itertools
 import json
+import math
 import ntpath
 import os
 import platform
+import queue
 import re
 import shutil
 import signal
+import sqlite3
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 from base64 import b64decode
 from builtins import print as oprint
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from copy import deepcopy
+from dataclasses import asdict, dataclass, field, replace
 from datetime import timedelta
+from glob import escape as glob_escape
 from glob import glob
-from multiprocessing import cpu_count
 from types import SimpleNamespace
-from typing import Any, NoReturn
+from typing import TYPE_CHECKING, Any, NoReturn
 
-import requests
-import toml
-import xmltodict
-from packaging import version
-from platformdirs import PlatformDirs
+# rich.print only loads the console when it gets called, everything heavier gets imported where it's used
 from rich import print
-from rich.console import Console
-from rich.progress import BarColumn, Progress, TaskID
-from rich.prompt import Confirm, Prompt
-from rich.syntax import Syntax
-from rich.table import Table
-from unidecode import unidecode
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+
+    from rich.progress import TaskID
 
 sys.path.append('.')
 
@@ -47,7 +53,20 @@ from deew.xml_base import xml_ac4_base, xml_dd_ddp_base, xml_thd_base
 prog_name = 'deew'
 prog_version = '3.2.2'
 
-simplens = SimpleNamespace()
+# a rough upper bound of what a DEE instance uses, to fit the instances into a memory limit
+dee_instance_memory = 512 * 1024 ** 2
+# seconds of 5.1 DD/DDP audio a DEE instance encodes in a second, the seconds it takes to start and how much longer
+# a whole run takes than its encodes (decoding, other load), until a run on this machine has been timed
+dee_rate_guess = (50.0, 1.0, 1.0)
+
+dee_progress_re = re.compile(r'Stage progress: ([0-9]+\.[0-9])')
+dee_loudness_re = re.compile(r'(?:measured_loudness|speech gated loudness)(?:=|: )(-?[0-9]+(?:\.[0-9]+)?)')
+dee_error_re = re.compile(r'error', re.IGNORECASE)
+
+simplens = SimpleNamespace(api=False, configured=False, events=None, events_lock=threading.Lock(), callbacks={}, cache_lock=threading.Lock())
+args: argparse.Namespace
+# plan() and run() share the module state, so an embedding process goes through them one at a time
+api_lock = threading.Lock()
 
 
 class RParse(argparse.ArgumentParser):
@@ -73,127 +92,197 @@ class CustomHelpFormatter(argparse.RawTextHelpFormatter):
         return ', '.join(action.option_strings) + ' ' + args_string
 
 
-parser = RParse(
-    prog=prog_name,
-    add_help=False,
-    formatter_class=lambda prog: CustomHelpFormatter(prog, width=78, max_help_position=32)
-)
-parser.add_argument('-h', '--help',
-                    action='help',
-                    default=argparse.SUPPRESS,
-                    help='show this help message.')
-parser.add_argument('-v', '--version',
-                    action='version',
-                    version=f'[bold cyan]{prog_name}[/bold cyan] [not bold white]{prog_version}[/not bold white]',
-                    help='show version.')
-parser.add_argument('-i', '--input',
-                    nargs='*',
-                    default=argparse.SUPPRESS,
-                    help='audio file(s) or folder(s)')
-parser.add_argument('-ti', '--track-index',
-                    type=int,
-                    default=0,
-                    metavar='INDEX',
-                    help=
-'''[underline magenta]default:[/underline magenta] [bold color(231)]0[/bold color(231)]
-select audio track index of input(s)''')
-parser.add_argument('-o', '--output',
-                    default=None,
-                    metavar='DIRECTORY',
-                    help='[underline magenta]default:[/underline magenta] current directory\nspecifies output directory')
-parser.add_argument('-f', '--format',
-                    type=str,
-                    default='ddp',
-                    help=
-'''[underline magenta]options:[/underline magenta] [bold color(231)]dd[/bold color(231)] / [bold color(231)]ddp[/bold color(231)] / [bold color(231)]ac4[/bold color(231)] / [bold color(231)]thd[/bold color(231)]
-[underline magenta]default:[/underline magenta] [bold color(231)]ddp[/bold color(231)]''')
-parser.add_argument('-b', '--bitrate',
-                    type=int,
-                    default=None,
-                    help=
-'''[underline magenta]options:[/underline magenta] run [green]-lb[/green]/[green]--list-bitrates[/green]
-[underline magenta]default:[/underline magenta] run [green]-c[/green]/[green]--config[/green]''')
-parser.add_argument('-dm', '--downmix',
-                    type=int,
-                    default=None,
-                    metavar='CHANNELS',
-                    help=
-'''[underline magenta]options:[/underline magenta] [bold color(231)]1[/bold color(231)] / [bold color(231)]2[/bold color(231)] / [bold color(231)]6[/bold color(231)]
+def build_parser() -> RParse:
+    parser = RParse(
+        prog=prog_name,
+        add_help=False,
+        formatter_class=lambda prog: CustomHelpFormatter(prog, width=78, max_help_position=32)
+    )
+    parser.add_argument('-h', '--help',
+                        action='help',
+                        default=argparse.SUPPRESS,
+                        help='show this help message.')
+    parser.add_argument('-v', '--version',
+                        action='version',
+                        version=f'[bold cyan]{prog_name}[/bold cyan] [not bold white]{prog_version}[/not bold white]',
+                        help='show version.')
+    parser.add_argument('-i', '--input',
+                        nargs='*',
+                        default=argparse.SUPPRESS,
+                        help='audio file(s) or folder(s)')
+    parser.add_argument('-ti', '--track-index',
+                        type=str,
+                        default='0',
+                        metavar='INDEX',
+                        help=
+    '''[underline magenta]examples:[/underline magenta] [bold color(231)]0[/bold color(231)], [bold color(231)]0,1,3[/bold color(231)], [bold color(231)]all[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]0[/bold color(231)]
+select audio track index(es) of input(s)
+multiple tracks get extracted with a single ffmpeg run''')
+    parser.add_argument('-o', '--output',
+                        default=None,
+                        metavar='DIRECTORY',
+                        help='[underline magenta]default:[/underline magenta] current directory\nspecifies output directory')
+    parser.add_argument('-f', '--format',
+                        type=str,
+                        default='ddp',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]dd[/bold color(231)] / [bold color(231)]ddp[/bold color(231)] / [bold color(231)]ac4[/bold color(231)] / [bold color(231)]thd[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]ddp[/bold color(231)]
+multiple formats can be separated by commas ([bold color(231)]ddp,dd[/bold color(231)])''')
+    parser.add_argument('-b', '--bitrate',
+                        type=str,
+                        default=None,
+                        help=
+    '''[underline magenta]options:[/underline magenta] run [green]-lb[/green]/[green]--list-bitrates[/green]
+[underline magenta]default:[/underline magenta] run [green]-c[/green]/[green]--config[/green]
+multiple bitrates can be separated by commas ([bold color(231)]640,1024[/bold color(231)])
+every format gets encoded with every bitrate from the same intermediate''')
+    parser.add_argument('-dm', '--downmix',
+                        type=int,
+                        default=None,
+                        metavar='CHANNELS',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]1[/bold color(231)] / [bold color(231)]2[/bold color(231)] / [bold color(231)]6[/bold color(231)]
 specifies downmix, only works for DD/DDP
 DD will be automatically downmixed to 5.1 in case of a 7.1 source''')
-parser.add_argument('-d', '--delay',
-                    type=str,
-                    default=None,
-                    help=
-'''[underline magenta]examples:[/underline magenta] [bold color(231)]-5.1ms[/bold color(231)], [bold color(231)]+1,52s[/bold color(231)], \
+    parser.add_argument('-d', '--delay',
+                        type=str,
+                        default=None,
+                        help=
+    '''[underline magenta]examples:[/underline magenta] [bold color(231)]-5.1ms[/bold color(231)], [bold color(231)]+1,52s[/bold color(231)], \
 [bold color(231)]-24@pal[/bold color(231)], [bold color(231)]+10@24000/1001[/bold color(231)]
 [underline magenta]default:[/underline magenta] [bold color(231)]0ms[/bold color(231)] or parsed from filename
 specifies delay as ms, s or frame@FPS
 FPS can be a number, division or ntsc / pal
 you have to specify negative values as [bold color(231)]-[/bold color(231)][bold color(231)]d=-0ms[/bold color(231)]''')
-parser.add_argument('-r', '--drc',
-                    type=str,
-                    default='music_light',
-                    help=
-'''[underline magenta]options:[/underline magenta] [bold color(231)]film_light[/bold color(231)] / [bold color(231)]film_standard[/bold color(231)] / \
+    parser.add_argument('-r', '--drc',
+                        type=str,
+                        default='music_light',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]film_light[/bold color(231)] / [bold color(231)]film_standard[/bold color(231)] / \
 [bold color(231)]music_light[/bold color(231)] / [bold color(231)]music_standard[/bold color(231)] / [bold color(231)]speech[/bold color(231)]
 [underline magenta]default:[/underline magenta] [bold color(231)]music_light[/bold color(231)] (this is the closest to the missing none preset)
 specifies drc profile''')
-parser.add_argument('-dn', '--dialnorm',
-                    type=int,
-                    default=0,
-                    help=
-'''[underline magenta]options:[/underline magenta] between [bold color(231)]-31[/bold color(231)] and [bold color(231)]0[/bold color(231)] \
+    parser.add_argument('-dn', '--dialnorm',
+                        type=int,
+                        default=0,
+                        help=
+    '''[underline magenta]options:[/underline magenta] between [bold color(231)]-31[/bold color(231)] and [bold color(231)]0[/bold color(231)] \
 (in case of [bold color(231)]0[/bold color(231)] DEE\'s measurement will be used)
 [underline magenta]default:[/underline magenta] [bold color(231)]0[/bold color(231)]
 applied dialnorm value between''')
-parser.add_argument('-in', '--instances',
-                    type=str,
-                    default=None,
-                    help=
-'''[underline magenta]examples:[/underline magenta] [bold color(231)]1[/bold color(231)], [bold color(231)]4[/bold color(231)], [bold color(231)]50%%[/bold color(231)]
+    parser.add_argument('-in', '--instances',
+                        type=str,
+                        default=None,
+                        help=
+    '''[underline magenta]examples:[/underline magenta] [bold color(231)]1[/bold color(231)], [bold color(231)]4[/bold color(231)], [bold color(231)]50%%[/bold color(231)]
 [underline magenta]default:[/underline magenta] [bold color(231)]50%%[/bold color(231)]
 specifies how many encodes can run at the same time
 [bold color(231)]50%%[/bold color(231)] means [bold color(231)]4[/bold color(231)] on a cpu with 8 threads
 one DEE can use 2 threads so [bold color(231)]50%%[/bold color(231)] can utilize all threads
 (this option overrides the config\'s number)''')
-parser.add_argument('-k', '--keeptemp',
-                    action='store_true',
-                    help='keep temp files')
-parser.add_argument('-mo', '--measure-only',
-                    action='store_true',
-                    help='kills DEE when the dialnorm gets written to the progress bar\nthis option overrides format with ddp')
-parser.add_argument('-fs', '--force-standard',
-                    action='store_true',
-                    help='force standard profile for 7.1 DDP encoding (384-1024 kbps)')
-parser.add_argument('-fb', '--force-bluray',
-                    action='store_true',
-                    help='force bluray profile for 7.1 DDP encoding (768-1664 kbps)')
-parser.add_argument('-lb', '--list-bitrates',
-                    action='store_true',
-                    help='list bitrates that DEE can do for DD and DDP encoding')
-parser.add_argument('-la', '--long-argument',
-                    action='store_true',
-                    help='print ffmpeg and DEE arguments for each input')
-parser.add_argument('-np', '--no-prompt',
-                    action='store_true',
-                    help='disables prompt')
-parser.add_argument('-pl', '--print-logos',
-                    action='store_true',
-                    help='show all logo variants you can set in the config')
-parser.add_argument('-cl', '--changelog',
-                    action='store_true',
-                    help='show changelog')
-parser.add_argument('-c', '--config',
-                    action='store_true',
-                    help='show config and config location(s)')
-parser.add_argument('-gc', '--generate-config',
-                    action='store_true',
-                    help='generate a new config')
-args = parser.parse_args()
+    parser.add_argument('-di', '--decode-instances',
+                        type=str,
+                        default=None,
+                        help=
+    '''[underline magenta]examples:[/underline magenta] [bold color(231)]1[/bold color(231)], [bold color(231)]2[/bold color(231)], [bold color(231)]25%%[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]2[/bold color(231)]
+specifies how many ffmpeg decodes can run at the same time
+decoding runs separately from the DEE instances
+(this option overrides the config\'s number)''')
+    parser.add_argument('-or', '--order',
+                        type=str,
+                        default='longest',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]longest[/bold color(231)] / [bold color(231)]shortest[/bold color(231)] / [bold color(231)]input[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]longest[/bold color(231)]
+specifies the order of the encodes based on their estimated cost
+longest first gives the shortest total time, shortest first gives results earlier''')
+    parser.add_argument('-sg', '--segments',
+                        type=int,
+                        default=1,
+                        help='split each DD/DDP encode into this many segments that get encoded in parallel\n\
+the loudness is measured once for the whole input, segments are at least a minute long\n\
+not used for inputs with a delay')
+    parser.add_argument('-k', '--keeptemp',
+                        action='store_true',
+                        help='keep temp files')
+    parser.add_argument('-st', '--stream',
+                        action='store_true',
+                        help='stream ffmpeg\'s output into DEE through a named pipe instead of a temp file\n\
+falls back to a temp file if DEE has to read the input twice')
+    parser.add_argument('-npc', '--no-probe-cache',
+                        action='store_true',
+                        help='ignore the probe cache and run ffprobe on every input')
+    parser.add_argument('-il', '--invalidate-loudness',
+                        action='store_true',
+                        help='measure the loudness again instead of using the cached dialnorm of the inputs')
+    parser.add_argument('-pc', '--prune-cache',
+                        action='store_true',
+                        help='remove cached probe and loudness results of missing or modified files')
+    parser.add_argument('-mo', '--measure-only',
+                        action='store_true',
+                        help='kills DEE when the dialnorm gets written to the progress bar\nthis option overrides format with ddp')
+    parser.add_argument('-me', '--measure-engine',
+                        type=str,
+                        default='dee',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]dee[/bold color(231)] / [bold color(231)]native[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]dee[/bold color(231)]
+engine used by -mo/--measure-only, native measures the BS.1770 integrated loudness
+of the decoded audio without temp files or DEE (needs numpy)
+it doesn't use DEE's dialogue intelligence, so the results can differ''')
+    parser.add_argument('-mr', '--measure-report',
+                        type=str,
+                        help='write the results of -mo/--measure-only to a CSV or JSON (.json) file')
+    parser.add_argument('-fs', '--force-standard',
+                        action='store_true',
+                        help='force standard profile for 7.1 DDP encoding (384-1024 kbps)')
+    parser.add_argument('-fb', '--force-bluray',
+                        action='store_true',
+                        help='force bluray profile for 7.1 DDP encoding (768-1664 kbps)')
+    parser.add_argument('-lb', '--list-bitrates',
+                        action='store_true',
+                        help='list bitrates that DEE can do for DD and DDP encoding')
+    parser.add_argument('-la', '--long-argument',
+                        action='store_true',
+                        help='print ffmpeg and DEE arguments for each input')
+    parser.add_argument('-np', '--no-prompt',
+                        action='store_true',
+                        help='disables prompt')
+    parser.add_argument('-pr', '--progress',
+                        type=str,
+                        default='bar',
+                        metavar='MODE',
+                        help=
+    '''[underline magenta]options:[/underline magenta] [bold color(231)]bar[/bold color(231)] / [bold color(231)]json[/bold color(231)]
+[underline magenta]default:[/underline magenta] [bold color(231)]bar[/bold color(231)]
+[bold color(231)]json[/bold color(231)] writes one event per line to stdout instead of progress bars
+other output goes to stderr, prompts are disabled''')
+    parser.add_argument('-ps', '--progress-socket',
+                        type=str,
+                        default=None,
+                        metavar='ADDRESS',
+                        help='send the [bold color(231)]json[/bold color(231)] events to a unix socket or [bold color(231)]host:port[/bold color(231)] instead of stdout')
+    parser.add_argument('-pl', '--print-logos',
+                        action='store_true',
+                        help='show all logo variants you can set in the config')
+    parser.add_argument('-cl', '--changelog',
+                        action='store_true',
+                        help='show changelog')
+    parser.add_argument('-c', '--config',
+                        action='store_true',
+                        help='show config and config location(s)')
+    parser.add_argument('-gc', '--generate-config',
+                        action='store_true',
+                        help='generate a new config')
+    return parser
 
 
 def print_changelog() -> None:
+    import requests
+
     try:
         r = requests.get('https://api.github.com/repos/pcroland/deew/contents/changelog.md')
         changelog = json.loads(r.text)['content']
@@ -253,11 +342,62 @@ logo = 1
 # It can be a number or a % compared to your number of threads (so '50%' means 4 on an 8 thread cpu).
 # One DEE can use 2 threads so setting '50%' can utilize all threads.
 # You can override this setting with -in/--instances.
-# The number will be clamped between 1 and cpu_count().
-# With the Windows version of DEE the max will be cpu_count() - 2 or 6 due to a limitation.
+# The number will be clamped between 1 and the number of usable threads.
+# Usable threads respect the CPU affinity and a cgroup v2 CPU quota (e.g. in containers), a memory limit lowers the max as well.
+# With the Windows version of DEE the max will be the number of threads - 2 or 6 due to a limitation.
 # examples: 1, 4, '50%'
 max_instances = '50%'
 
+# Lowers or raises the number of running encodes during the run (between 1 and the number above),
+# based on the load average, pressure stall information and free memory. Only works on Linux.
+adaptive_instances = false
+
+# Pins every DEE instance to its own pair of threads, SMT siblings or threads sharing an L2 cache where possible.
+# Only works on Linux with the Linux version of DEE.
+pin_instances = false
+
+# CPU and I/O priority of ffmpeg decodes, so they don't take time away from the encodes.
+# decode_nice: 0 (normal) to 19 (lowest), decode_ionice: 'best-effort', 'idle' or '' to leave it alone (Linux only).
+decode_nice = 10
+decode_ionice = 'best-effort'
+
+# Specifies how many ffmpeg decodes can run at the same time, independently of the DEE instances above.
+# It can be a number or a % compared to your number of threads, you can override it with -di/--decode-instances.
+decode_instances = 2
+
+# Limits how many decodes can read from or write to the same drive at once, on top of the decode instances.
+# Keeps hard drives streaming instead of seeking between inputs and intermediates, 0 means no limit.
+device_decode_instances = 0
+
+# Limits for specific drives, any path on the drive can be used.
+# [device_decode_limits]
+#     '/mnt/array' = 1
+
+# Intermediate WAV files are kept in the temp directory up to this size (in GB) and reused
+# for later encodes of the same input, the least recently used ones get deleted above it.
+# Set to 0 to delete intermediates after encoding.
+intermediate_cache_size = 0
+
+# Sample format of intermediates that get resampled, other inputs keep their own bit depth.
+# 'auto' uses 24 bit unless the input has more, 'float' writes 32 bit float.
+# options: 'auto', 24, 32, 'float'
+intermediate_depth = 'auto'
+
+# Free space (in GB) that is left alone on the temp path's drive.
+# A decode only starts when its intermediates fit above it, otherwise it waits for other intermediates to get deleted.
+temp_reserve = 1
+
+# Intermediates can be written to a RAM backed directory (like '/dev/shm/deew') up to this size (in GB) at once,
+# files that don't fit go to the temp path. Only used when intermediates are deleted after encoding.
+# Leave it empty to disable it.
+ram_temp_path = ''
+ram_temp_size = 0
+
+# The latest version shown in the summary is looked up in the background and cached for this many hours.
+# Offline machines only wait for the timeout (in seconds) once per period.
+update_check_ttl = 24
+update_check_timeout = 2
+
 [default_bitrates]
     dd_1_0 = 128
     dd_2_0 = 256
@@ -281,6 +421,7 @@ max_instances = '50%'
         print(f'''Please choose config's location:
 [bold magenta]1[/bold magenta]: {conf1}
 [bold magenta]2[/bold magenta]: {conf2}''')
+        from rich.prompt import Prompt
         c_loc = Prompt.ask('Location', choices=['1','2'])
         if c_loc == '1':
             createdir(conf_dir)
@@ -294,6 +435,8 @@ max_instances = '50%'
     with open(c_loc, 'w') as fl:
         fl.write(config_content)
     print()
+    from rich.console import Console
+    from rich.syntax import Syntax
     Console().print(Syntax(config_content, 'toml'))
     print(f'\n[bold cyan]The above config has been created at:[/bold cyan]\n{c_loc}')
     sys.exit(1)
@@ -309,11 +452,6 @@ def trim_names(fl: str, compensate: int) -> str:
     return fl.ljust(40 - compensate, ' ')
 
 
-def stamp_to_sec(stamp):
-    l = stamp.split(':')
-    return int(l[0])*3600 + int(l[1])*60 + float(l[2])
-
-
 def parse_version_string(inp: list) -> str:
     try:
         v = subprocess.run(inp, capture_output=True, encoding='utf-8').stdout
@@ -362,15 +500,18 @@ def convert_delay_to_ms(inp, compensate):
     delay_mode = 'prepend_silence_duration'
     if delay < 0:
         delay_mode = 'start'
-        delay_xml = str(timedelta(seconds = (abs(delay) / 1000)))
-        if '.' not in delay_xml:
-            delay_xml = f'{delay_xml}.0'
+        delay_xml = timestamp(abs(delay) / 1000)
     else:
         delay_xml = format(delay / 1000, ".6f")
 
     return delay_print, delay_xml, delay_mode
 
 
+def timestamp(seconds: float) -> str:
+    stamp = str(timedelta(seconds=seconds))
+    return stamp if '.' in stamp else f'{stamp}.0'
+
+
 def channel_number_to_name(inp: int):
     channel_names = {
         1: 'mono',
@@ -385,6 +526,18 @@ def find_closest_allowed(value: int, allowed_values: list[int]) -> int:
     return min(allowed_values, key=lambda list_value: abs(list_value - value))
 
 
+def dee_measures(aformat: str, dialnorm: int) -> bool:
+    # DEE 5.2 and up makes a separate measuring pass for DD/DDP/AC4, TrueHD only measures for the dialnorm
+    # a custom dialnorm (given or cached) takes the place of the measurement for every format
+    if dialnorm: return False
+    return aformat == 'thd' or simplens.dee_measure_pass
+
+
+def dee_reads_twice(job: Job) -> bool:
+    if args.measure_only: return False
+    return job.measures
+
+
 def wpc(p: str, quote: bool=False) -> str:
     if not simplens.is_nonnative_exe:
         if quote: p = f'\"{p}\"'
@@ -401,314 +554,88 @@ def rwpc(p: str) -> str:
     return re.sub(r'^([a-z]):/', lambda m: f'/mnt/{m.group(1).lower()}/', p.replace('\\', '/'), flags=re.IGNORECASE)
 
 
-def save_xml(f: str, xml: dict[str, Any]) -> None:
-    with open(f, 'w', encoding='utf-8') as fd:
-        fd.write(xmltodict.unparse(xml, pretty=True, indent='  ').replace('&amp;', '&'))
-
-
-def basename(fl: str, format_: str, quote: bool=False, sanitize: bool=False, stripdelay: bool=False) -> str:
-    name = os.path.basename(os.path.splitext(fl)[0]) + f'.{format_}'
-    if stripdelay: name = re.sub(r' ?DELAY [-|+]?[0-9]+m?s', '', name)
-    if sanitize: name = unidecode(name).replace(' ', '_')
-    if quote: name = f'\"{name}\"'
-    return name
-
-
-def print_exit(message: str, insert: Any = None) -> NoReturn:
-    if insert and '🤠' in error_messages[message]:
-        message_split = error_messages[message].split('🤠')
-        before, after = message_split[0], message_split[1]
-        exit_message = f'[color(231) on red]ERROR:[/color(231) on red] {before}{insert}{after}'
-    else:
-        exit_message = f'[color(231) on red]ERROR:[/color(231) on red] {error_messages[message]}'
-    print(exit_message)
-    sys.exit(1)
+def intermediate_key(fl: str, trackindex: int, codec: str, resample_value: str, channel_swap: bool) -> str:
+    st = os.stat(fl)
+    identity = [os.path.abspath(fl), st.st_size, st.st_mtime_ns, trackindex, codec, resample_value, channel_swap]
+    return hashlib.sha1(json.dumps(identity).encode()).hexdigest()[:16]
 
 
-def createdir(out: str) -> None:
+def wav_layout(fl: str) -> tuple[bytes, int, int] | None:
+    # the fmt chunk and the offset and size of the data chunk, None if the file is incomplete
+    # a pipe left behind by a killed streaming run would block the read
+    if not os.path.isfile(fl): return None
     try:
-        os.makedirs(out, exist_ok=True)
-    except OSError:
-        print_exit('create_dir', out)
-
-
-def encode(task_id: TaskID, settings: list) -> None:
-    config, pb = simplens.config, simplens.pb
-    fl, output, length, ffmpeg_args, dee_args, intermediate_exists, aformat = settings
-    fl_b = os.path.basename(fl)
-    pb.update(description=f'[bold][cyan]starting[/cyan][/bold]...{" " * 24}', task_id=task_id, visible=True)
-
-    if not intermediate_exists:
-        if length == -1:
-            pb.update(description=f'[bold][cyan]ffmpeg[/cyan][/bold] | {trim_names(fl_b, 6)}', task_id=task_id, total=None)
-            ffmpeg = subprocess.run(ffmpeg_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='ignore')
-        else:
-            pb.update(description=f'[bold][cyan]ffmpeg[/cyan][/bold] | {trim_names(fl_b, 6)}', task_id=task_id, total=100)
-            ffmpeg = subprocess.Popen(ffmpeg_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='ignore')
-            percentage_length = length / 100
-            with ffmpeg.stdout:
-                for line in iter(ffmpeg.stdout.readline, ''):
-                    if '=' not in line: continue
-                    progress = re.search(r'time=([^\s]+)', line)
-                    if progress:
-                        timecode = stamp_to_sec(progress[1]) / percentage_length
-                        pb.update(task_id=task_id, completed=timecode)
-        pb.update(task_id=task_id, completed=100)
-        time.sleep(0.5)
-
-    if args.dialnorm != 0 and aformat == 'thd':
-        pb.update(description=f'[bold cyan]DEE[/bold cyan]: encode | {trim_names(fl_b, 11)}', task_id=task_id, completed=0, total=100)
-    else:
-        pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(fl_b, 12)}', task_id=task_id, completed=0, total=100)
-    dee = subprocess.Popen(dee_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, encoding='utf-8', errors='ignore')
-    with dee.stdout:
-        encoding_step = False
-        for line in iter(dee.stdout.readline, ''):
-            if not encoding_step and re.search(r'(measured_loudness|speech gated loudness)', line):
-                encoding_step = True
-                measured_dn = re.search(r'(measured_loudness|speech\ gated\ loudness)(\=|\:\ )(-?.+)', line)
-                measured_dn = round(float(measured_dn[3].strip('.')))
-                measured_dn = str(clamp(measured_dn, -31, 0))
-                if args.measure_only:
-                    pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(fl_b, 18 + len(measured_dn))} ({measured_dn} dB)', task_id=task_id, completed=100)
-                    dee.kill()
+        size = os.path.getsize(fl)
+        with open(fl, 'rb') as fd:
+            header = fd.read(12)
+            if header[0:4] not in [b'RIFF', b'RF64'] or header[8:12] != b'WAVE': return None
+            fmt, data_size = None, None
+            while True:
+                chunk = fd.read(8)
+                if len(chunk) < 8: return None
+                chunk_id, chunk_size = chunk[0:4], int.from_bytes(chunk[4:8], 'little')
+                if chunk_id == b'ds64':
+                    data_size = int.from_bytes(fd.read(chunk_size)[8:16], 'little')
+                    fd.seek(chunk_size % 2, 1)
+                elif chunk_id == b'fmt ':
+                    fmt = fd.read(chunk_size)
+                    fd.seek(chunk_size % 2, 1)
+                elif chunk_id == b'data':
+                    if header[0:4] == b'RIFF': data_size = chunk_size
+                    # ffmpeg only fills in the sizes when it finishes, a killed run leaves them empty
+                    if not fmt or not data_size or fd.tell() + data_size > size: return None
+                    return fmt, fd.tell(), data_size
                 else:
-                    pb.update(description=f'[bold cyan]DEE[/bold cyan]: encode | {trim_names(fl_b, 17 + len(measured_dn))} ({measured_dn} dB)', task_id=task_id)
-
-            progress = re.search(r'Stage progress: ([0-9]+\.[0-9])', line)
-            if progress and progress[1] != '100.0':
-                if aformat != 'thd' and version.parse(simplens.dee_version.replace('-master', '')) >= version.parse('5.2.0') and not encoding_step:
-                    pb.update(task_id=task_id, completed=float(progress[1]) / 4)
-                else:
-                    pb.update(task_id=task_id, completed=float(progress[1]))
-
-            if 'error' in line.lower():
-                oprint(line.rstrip().split(': ', 1)[1])
-    pb.update(task_id=task_id, completed=100)
-
-    if not args.keeptemp:
-        wav_file = os.path.join(config['temp_path'], basename(fl, 'wav'))
-        del_time = 0
-        while os.path.exists(wav_file) and del_time < 10:
-            try:
-                os.remove(wav_file)
-            except PermissionError:
-                # likely dee still use it
-                del_time += 1
-                time.sleep(1)
-
-        if os.path.exists(wav_file):
-            print(f'[bold yellow]Failed to delete:[/bold yellow] {wav_file}')
-        os.remove(os.path.join(config['temp_path'], basename(fl, 'xml', sanitize=True)))
-
-    if args.format.lower() == 'thd':
-        os.remove(os.path.join(output, basename(fl, 'thd.log')))
-        os.remove(os.path.join(output, basename(fl, 'thd.mll')))
-
-
-def main() -> None:
-    if len(sys.argv) == 1:
-        parser.print_help(sys.stderr)
-        sys.exit(1)
-
-    if args.changelog: print_changelog()
-    if args.list_bitrates: list_bitrates()
-    if args.print_logos: print_logos()
-
-    if getattr(sys, 'frozen', False):
-        script_path = os.path.dirname(sys.executable)
-        standalone = 1
-    else:
-        script_path = os.path.dirname(__file__)
-        standalone = 0
-
-    dirs = PlatformDirs('deew', False)
-    config_dir_path = dirs.user_config_dir
-    config_path1 = os.path.join(config_dir_path, 'config.toml')
-    config_path2 = os.path.join(script_path, 'config.toml')
-
-    if args.config:
-        if standalone:
-            print(f'[bold cyan]Your config locations:[/bold cyan]\n{config_path1}\n{config_path2}\n\n[bold cyan]Your current config:[/bold cyan]')
-            if os.path.exists(config_path1):
-                current_conf = config_path1
-            elif os.path.exists(config_path2):
-                current_conf = config_path2
-            else:
-                print('You don\'t have a config currently.')
-                sys.exit(0)
-        else:
-            print(f'[bold cyan]Your config location:[/bold cyan]\n{config_path1}\n\n[bold cyan]Your current config:[/bold cyan]')
-            if os.path.exists(config_path1):
-                current_conf = config_path1
-            else:
-                print('You don\'t have a config currently.')
-                sys.exit(0)
-        with open(current_conf, 'r') as conf:
-            Console().print(Syntax(conf.read(), 'toml'))
-        sys.exit(0)
-
-    if args.generate_config:
-        generate_config(standalone, config_path1, config_path2, config_dir_path)
-        sys.exit(0)
-
-    if not os.path.exists(config_path1) and not os.path.exists(config_path2):
-        print(f'[bold yellow]config.toml[/bold yellow] [not bold white]is missing, creating one...[/not bold white]')
-        generate_config(standalone, config_path1, config_path2, config_dir_path)
-
-    try:
-        config = toml.load(config_path1)
-    except Exception:
-        config = toml.load(config_path2)
-    simplens.config = config
-
-    if 0 < config['logo'] < len(logos) + 1: print(logos[config['logo'] - 1])
-
-    config_keys = [
-                    'ffmpeg_path',
-                    'ffprobe_path',
-                    'dee_path',
-                    'temp_path',
-                    'logo',
-                    'max_instances',
-                    'default_bitrates',
-                    'summary_sections'
-                ]
-    c_key_missing = []
-    for c_key in config_keys:
-        if c_key not in config: c_key_missing.append(c_key)
-    if len(c_key_missing) > 0: print_exit('config_key', f'[bold yellow]{"[not bold white], [/not bold white]".join(c_key_missing)}[/bold yellow]')
+                    fd.seek(chunk_size + chunk_size % 2, 1)
+    except OSError:
+        return None
 
-    for i in config['dee_path'], config['ffmpeg_path'], config['ffprobe_path']:
-        if not shutil.which(i): print_exit('binary_exist', i)
 
-    with open(shutil.which(config['dee_path']), 'rb') as fd:
-        simplens.dee_is_exe = fd.read(2) == b'\x4d\x5a'
-    simplens.is_nonnative_exe = simplens.dee_is_exe and platform.system() != 'Windows'
+def wav_is_complete(fl: str) -> bool:
+    return wav_layout(fl) is not None
 
-    if not config['temp_path']:
-        if simplens.is_nonnative_exe:
-            config['temp_path'] = rwpc(ntpath.join(
-                subprocess.run(['powershell.exe', "(gi $env:TEMP).fullname"], capture_output=True, encoding='utf-8').stdout.strip(),
-                'deew',
-            ))
-        else:
-            config['temp_path'] = os.path.join(script_path, 'temp') if standalone else tempfile.gettempdir()
-            if config['temp_path'] == '/tmp':
-                config['temp_path'] = '/var/tmp/deew'
-    config['temp_path'] = os.path.abspath(config['temp_path'])
-    createdir(config['temp_path'])
 
-    cpu__count = cpu_count()
-    if args.instances:
-        instances = args.instances
-    else:
-        instances = config['max_instances']
-    if isinstance(instances, str) and instances.endswith('%'):
-        instances = cpu__count * (int(instances.replace('%', '')) / 100)
-    else:
-        instances = int(instances)
-    if simplens.dee_is_exe:
-        instances = clamp(instances, 1, cpu__count - 2)
-        instances = clamp(instances, 1, 6)
-    else:
-        instances = clamp(instances, 1, cpu__count)
-    if instances == 0: instances = 1
+def evict_intermediates(temp_path: str, budget: int) -> None:
+    cached = [f for f in glob(os.path.join(glob_escape(temp_path), '*.wav')) if re.search(r'\.[0-9a-f]{16}\.wav$', f)]
+    cached.sort(key=os.path.getmtime, reverse=True)
+    total = 0
+    for f in cached:
+        total += os.path.getsize(f)
+        if total > budget: os.remove(f)
 
-    aformat = args.format.lower()
-    bitrate = args.bitrate
-    downmix = args.downmix
-    args.dialnorm = clamp(args.dialnorm, -31, 0)
-    trackindex = max(0, args.track_index)
 
-    if aformat not in ['dd', 'ddp', 'thd', 'ac4']: print_exit('format')
-    if downmix and downmix not in [1, 2, 6]: print_exit('downmix')
-    if downmix and aformat == 'thd': print_exit('thd_downmix')
-    if args.drc not in ['film_light', 'film_standard', 'music_light', 'music_standard', 'speech', 'none']: print_exit('drc')
-    if not simplens.dee_is_exe and platform.system() == 'Linux' and aformat == 'thd': print_exit('linux_thd')
-    if args.measure_only: aformat = 'ddp'
+def job_cost(length: float, channels: int, aformat: str) -> float:
+    # rough DEE workload in seconds of 5.1 DD/DDP audio
+    format_weights = {'dd': 1.0, 'ddp': 1.0, 'ac4': 1.5, 'thd': 2.0}
+    return length * channels / 6 * format_weights[aformat]
 
-    filelist = []
-    for f in args.input:
-        if not os.path.exists(f): print_exit('path', f)
-        if os.path.isdir(f):
-            filelist.extend(glob(f + os.path.sep + '*'))
-        else:
-            filelist.append(f)
 
-    samplerate_list = []
-    channels_list = []
-    bit_depth_list = []
-    length_list = []
+def predict_makespan(costs: list[float], instances: int) -> float:
+    loads = [0.0] * instances
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
 
-    for f in filelist:
-        probe_args = [config["ffprobe_path"], '-v', 'quiet', '-select_streams', f'a:{trackindex}', '-print_format', 'json', '-show_format', '-show_streams', f]
-        try:
-            output = subprocess.check_output(probe_args, encoding='utf-8')
-        except subprocess.CalledProcessError:
-            print_exit('ffprobe')
-        audio = json.loads(output)['streams'][0]
-        samplerate_list.append(int(audio['sample_rate']))
-        channels_list.append(audio['channels'])
-        length_list.append(float(audio.get('duration', -1)))
-        depth = int(audio.get('bits_per_sample', 0))
-        if depth == 0: depth = int(audio.get('bits_per_raw_sample', 32))
-        bit_depth_list.append(depth)
 
-    if not samplerate_list.count(samplerate_list[0]) == len(samplerate_list): print_exit('sample_mismatch', samplerate_list)
-    if not channels_list.count(channels_list[0]) == len(channels_list): print_exit('channel_mismatch', channels_list)
-    if not bit_depth_list.count(bit_depth_list[0]) == len(bit_depth_list): print_exit('bitdepth_mismatch', bit_depth_list)
+def encode_makespan(file_plans: list[FilePlan], instances: int, rate: float, startup: float) -> float:
+    # wall-clock seconds of the encodes, the segments of a job run side by side
+    seconds = [startup + cost / job.segments / rate for p in file_plans for job, cost in zip(p.jobs, p.costs) for _ in range(job.segments)]
+    return predict_makespan(seconds, instances)
 
-    channels = channels_list[0]
-    samplerate = samplerate_list[0]
-    bit_depth = bit_depth_list[0]
-    if bit_depth not in [16, 24, 32]:
-        if bit_depth < 16:
-            bit_depth = 16
-        elif 16 < bit_depth < 24:
-            bit_depth = 24
-        else:
-            bit_depth = 32
 
-    if channels not in [1, 2, 6, 8]: print_exit('channels')
-    if downmix and downmix >= channels: print_exit('downmix_mismatch')
-    if not downmix and aformat == 'dd' and channels == 8: downmix = 6
-    if aformat == 'ac4' and channels != 6: print_exit('ac4_input_channels')
-    if aformat == 'ac4': downmix = 2
-    if aformat == 'thd' and channels == 1: print_exit('thd_mono_input')
-
-    downmix_config = 'off'
-    if downmix:
-        outchannels = downmix
-        downmix_config = channel_number_to_name(outchannels)
-    else:
-        outchannels = channels
+def predict_run(file_plans: list[FilePlan], instances: int) -> float | None:
+    if args.measure_only: return None
+    rate, startup, overhead = dee_rate()
+    simplens.plan.predicted = encode_makespan(file_plans, instances, rate, startup) * overhead
+    return simplens.plan.predicted
 
-    if outchannels in [1, 2] and aformat in ['dd', 'ddp'] and not args.measure_only:
-        if args.no_prompt:
-            print('Consider using [bold cyan]qaac[/bold cyan] or [bold cyan]opus[/bold cyan] for \
-[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding.')
-        else:
-            continue_enc = Confirm.ask('Consider using [bold cyan]qaac[/bold cyan] or [bold cyan]opus[/bold cyan] for \
-[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding, are you sure you want to use [bold cyan]DEE[/bold cyan]?')
-            if not continue_enc: sys.exit(1)
 
-    if outchannels == 2 and aformat == 'thd':
-        if args.no_prompt:
-            print('Consider using [bold cyan]FLAC[/bold cyan] for lossless \
-[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding.')
-        else:
-            continue_enc = Confirm.ask('Consider using [bold cyan]FLAC[/bold cyan] for lossless \
-[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding, are you sure you want to use [bold cyan]DEE[/bold cyan]?')
-            if not continue_enc: sys.exit(1)
+def parse_list(inp: str) -> list[str]:
+    return [i.strip() for i in inp.split(',') if i.strip()]
 
-    if args.dialnorm != 0:
-        if args.no_prompt:
-            print('Consider leaving the dialnorm value at 0 (auto), setting it manually can be dangerous.')
-        else:
-            continue_enc = Confirm.ask('Consider leaving the dialnorm value at 0 (auto), setting it manually can be dangerous, are you sure you want to do it?')
-            if not continue_enc: sys.exit(1)
 
+def resolve_bitrate(aformat: str, bitrate: int | None, outchannels: int) -> int | None:
+    config = simplens.config
     if aformat == 'dd':
         if outchannels == 1:
             if not bitrate: bitrate = config['default_bitrates']['dd_1_0']
@@ -740,13 +667,50 @@ def main() -> None:
     elif aformat == 'ac4':
         if not bitrate: bitrate = config['default_bitrates']['ac4_2_0']
         bitrate = find_closest_allowed(bitrate, allowed_bitrates['ac4_20'])
+    elif aformat == 'thd':
+        bitrate = None
+    return bitrate
 
-    if args.output:
-        createdir(os.path.abspath(args.output))
-        output = os.path.abspath(args.output)
-    else:
-        output = os.getcwd()
 
+def output_extension(aformat: str, bitrate: int | None) -> str:
+    if aformat == 'ddp':
+        if args.force_bluray: return 'eb3'
+        if args.force_standard: return 'ec3'
+        return 'eb3' if bitrate > 1024 else 'ec3'
+    if aformat == 'dd': return 'ac3'
+    return aformat
+
+
+def resample_target(aformat: str, samplerate: int) -> str:
+    if aformat in ['dd', 'ddp', 'ac4'] and samplerate != 48000:
+        return '48000'
+    elif aformat == 'thd' and samplerate not in [48000, 96000]:
+        return '48000' if samplerate < 72000 else '96000'
+    return ''
+
+
+def intermediate_codec(bit_depth: int, resample_value: str) -> str:
+    # resampling makes new samples, the input's own depth is only kept when there is nothing to round
+    if not resample_value: return f'pcm_s{bit_depth}le'
+    depth = simplens.intermediate_depth
+    if depth == 'float': return 'pcm_f32le'
+    if depth == 'auto': depth = max(24, bit_depth)
+    return f'pcm_s{depth}le'
+
+
+def intermediate_size(length: float, samplerate: int, channels: int, codec: str) -> int:
+    return int(max(length, 0) * samplerate * channels * int(re.search(r'\d+', codec)[0]) // 8)
+
+
+def format_size(size: float) -> str:
+    if size < 1024 ** 3: return f'{size / 1024 ** 2:.1f} MB'
+    return f'{size / 1024 ** 3:.2f} GB'
+
+
+def build_xml_base(aformat: str, bitrate: int | None, outchannels: int, downmix_config: str, output: str) -> dict[str, Any]:
+    import xmltodict
+
+    config = simplens.config
     if aformat in ['dd', 'ddp']:
         xml_base = xmltodict.parse(xml_dd_ddp_base)
         xml_base['job_config']['output']['ec3']['storage']['local']['path'] = wpc(output, quote=True)
@@ -767,6 +731,9 @@ def main() -> None:
         xml_base['job_config']['filter']['audio']['pcm_to_ddp']['drc']['line_mode_drc_profile'] = args.drc
         xml_base['job_config']['filter']['audio']['pcm_to_ddp']['drc']['rf_mode_drc_profile'] = args.drc
         xml_base['job_config']['filter']['audio']['pcm_to_ddp']['custom_dialnorm'] = args.dialnorm
+        if aformat == 'dd':
+            xml_base['job_config']['output']['ac3'] = xml_base['job_config']['output']['ec3']
+            del xml_base['job_config']['output']['ec3']
     elif aformat in ['ac4']:
         xml_base = xmltodict.parse(xml_ac4_base)
         xml_base['job_config']['output']['ac4']['storage']['local']['path'] = wpc(output, quote=True)
@@ -786,80 +753,323 @@ def main() -> None:
         xml_base['job_config']['filter']['audio']['encode_to_dthd']['custom_dialnorm'] = args.dialnorm
     xml_base['job_config']['input']['audio']['wav']['storage']['local']['path'] = wpc(config['temp_path'], quote=True)
     xml_base['job_config']['misc']['temp_dir']['path'] = wpc(config['temp_path'], quote=True)
+    return xml_base
 
-    simplens.dee_version = parse_version_string([config['dee_path']])
-    simplens.ffmpeg_version = parse_version_string([config['ffmpeg_path'], '-version'])
-    simplens.ffprobe_version = parse_version_string([config['ffprobe_path'], '-version'])
 
-    if not all(x is False for x in config["summary_sections"].values()):
-        summary = Table(title='Encoding summary', title_style='not italic bold magenta', show_header=False)
-        summary.add_column(style='green')
-        summary.add_column(style='color(231)')
+def save_xml(f: str, xml: dict[str, Any]) -> None:
+    import xmltodict
 
-        if config['summary_sections']['deew_info']:
-            try:
-                r = requests.get('https://api.github.com/repos/pcroland/deew/releases/latest')
-                latest_version = json.loads(r.text)['tag_name']
-                if version.parse(prog_version) < version.parse(latest_version):
-                    latest_version = f'[bold green]{latest_version}[/bold green] !!!'
-            except Exception:
-                latest_version = "[red]couldn't fetch"
-            summary.add_row('[bold cyan]Version', prog_version)
-            summary.add_row('[bold cyan]Latest', latest_version, end_section=True)
+    with open(f, 'w', encoding='utf-8') as fd:
+        fd.write(xmltodict.unparse(xml, pretty=True, indent='  ').replace('&amp;', '&'))
 
-        if config['summary_sections']['binaries']:
-            summary.add_row('[cyan]DEE version', simplens.dee_version)
-            summary.add_row('[cyan]ffmpeg version', simplens.ffmpeg_version)
-            summary.add_row('[cyan]ffprobe version', simplens.ffprobe_version, end_section=True)
 
-        if config['summary_sections']['input_info']:
-            summary.add_row('[bold yellow]Input')
-            summary.add_row('Channels', channel_number_to_name(channels))
-            summary.add_row('Bit depth', str(bit_depth), end_section=True)
+def basename(fl: str, format_: str, quote: bool=False, sanitize: bool=False, stripdelay: bool=False) -> str:
+    name = os.path.basename(os.path.splitext(fl)[0]) + f'.{format_}'
+    if stripdelay: name = re.sub(r' ?DELAY [-|+]?[0-9]+m?s', '', name)
+    if sanitize:
+        from unidecode import unidecode
+        name = unidecode(name).replace(' ', '_')
+    if quote: name = f'\"{name}\"'
+    return name
 
-        if not args.measure_only:
-            if config['summary_sections']['output_info']:
-                summary.add_row('[bold yellow]Output')
-                summary.add_row('Format', 'TrueHD' if aformat == 'thd' else aformat.upper())
-                summary.add_row('Channels', 'immersive stereo' if aformat == 'ac4' else channel_number_to_name(outchannels))
-                summary.add_row('Bitrate', 'N/A' if aformat == 'thd' else f'{str(bitrate)} kbps')
-                summary.add_row('Dialnorm', 'auto (0)' if args.dialnorm == 0 else f'{str(args.dialnorm)} dB', end_section=True)
 
-        if config['summary_sections']['other']:
-            if args.delay:
-                delay_print, delay_xml, delay_mode = convert_delay_to_ms(args.delay, compensate=False)
-            summary.add_row('[bold yellow]Other')
-            summary.add_row('Files', str(len(filelist)))
-            summary.add_row('Max instances', str(f'{instances:g}'))
-            summary.add_row('Delay', delay_print if args.delay else '0 ms or parsed from filename')
-            summary.add_row('Temp path', config['temp_path'])
+def plain(markup: str) -> str:
+    from rich.text import Text
+    return Text.from_markup(markup).plain
 
-        print(summary)
-        print()
 
-    resample_value = ''
-    if aformat in ['dd', 'ddp', 'ac4'] and samplerate != 48000:
-        bit_depth = 32
-        resample_value = '48000'
-    elif aformat == 'thd' and samplerate not in [48000, 96000]:
-        bit_depth = 32
-        if samplerate < 72000:
-            resample_value = '48000'
+def error_text(message: str, insert: Any = None) -> str:
+    if insert and '🤠' in error_messages[message]:
+        before, after = error_messages[message].split('🤠')
+        return f'{before}{insert}{after}'
+    return error_messages[message]
+
+
+def print_exit(message: str, insert: Any = None) -> NoReturn:
+    # the API can't exit the embedding process, it gets the error instead
+    if simplens.api: raise PlanError(message, insert)
+    exit_message = f'[color(231) on red]ERROR:[/color(231) on red] {error_text(message, insert)}'
+    emit('error', key=message, message=plain(exit_message).removeprefix('ERROR: '))
+    print(exit_message)
+    sys.exit(1)
+
+
+def emit(event: str, **fields: Any) -> None:
+    # one JSON object per line for --progress json, the callbacks of run() get the same fields
+    callback = simplens.callbacks.get(event)
+    if callback: callback(**fields)
+    events = simplens.events
+    if not events: return
+    line = json.dumps({'event': event, 'time': round(time.time(), 3), **fields}, ensure_ascii=False)
+    with simplens.events_lock:
+        try:
+            events.write(f'{line}\n')
+            events.flush()
+        except (OSError, ValueError):
+            # the reader is gone, the run itself carries on
+            simplens.events = None
+
+
+def open_events(address: str | None) -> Any:
+    if not address: return sys.stdout
+    import socket
+    try:
+        if os.path.exists(address) or ':' not in address:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(address)
         else:
-            resample_value = '96000'
+            host, port = address.rsplit(':', 1)
+            sock = socket.create_connection((host, int(port)))
+    except (OSError, ValueError, AttributeError):
+        print_exit('progress_socket', address)
+    return sock.makefile('w', encoding='utf-8')
+
+
+class NullProgress:
+    # stands in for rich's Progress with --progress json, nothing gets rendered
+    def __init__(self) -> None:
+        self.tasks = 0
+        self.console = SimpleNamespace(print=lambda text, **kwargs: emit('message', text=plain(str(text))))
+
+    def __enter__(self) -> NullProgress:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    def add_task(self, *args: Any, **kwargs: Any) -> int:
+        self.tasks += 1
+        return self.tasks
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def file_done(self, audio_length: float) -> None:
+        pass
+
+
+class BatchProgress:
+    # rows only get created once a job starts, the oldest finished rows make room for new ones
+    # workers just queue their updates, a single thread hands them to rich a few times a second
+    def __init__(self, window: int, files: int) -> None:
+        from rich.progress import BarColumn, Progress
+        self.progress = Progress('[', '{task.description}', ']', BarColumn(), '[magenta]{task.percentage:>3.2f}%', refresh_per_second=4)
+        self.console = self.progress.console
+        self.window, self.files = window, files
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.pending: dict[int, dict[str, Any]] = {}
+        self.hidden: dict[int, dict[str, Any]] = {}
+        self.rows: dict[int, TaskID] = {}
+        self.finished: deque[int] = deque()
+        self.done_files, self.audio_done = 0, 0.0
+        self.started = time.monotonic()
+        self.stop = threading.Event()
+        self.flusher = threading.Thread(target=self.run, daemon=True)
+        self.batch = None
+
+    def __enter__(self) -> BatchProgress:
+        self.progress.__enter__()
+        if self.files > 1: self.batch = self.progress.add_task(self.batch_description(), total=self.files)
+        self.flusher.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop.set()
+        self.flusher.join()
+        self.flush()
+        self.progress.__exit__(*exc)
+
+    def add_task(self, description: str = '', **kwargs: Any) -> int:
+        task_id = next(self.ids)
+        self.update(task_id=task_id, description=description, **kwargs)
+        return task_id
+
+    def update(self, task_id: int, **kwargs: Any) -> None:
+        with self.lock:
+            self.pending.setdefault(task_id, {}).update(kwargs)
+
+    def file_done(self, audio_length: float) -> None:
+        with self.lock:
+            self.done_files += 1
+            self.audio_done += max(audio_length, 0)
+
+    def run(self) -> None:
+        while not self.stop.wait(0.25): self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for task_id, fields in pending.items():
+            if task_id not in self.rows:
+                fields = {**self.hidden.pop(task_id, {}), **fields}
+                if not fields.get('visible', True):
+                    self.hidden[task_id] = fields
+                    continue
+                fields.setdefault('total', 100)
+                self.rows[task_id] = self.progress.add_task(**fields)
+            else:
+                self.progress.update(self.rows[task_id], **fields)
+        tasks = {task.id: task for task in self.progress.tasks}
+        for task_id in pending:
+            row = self.rows.get(task_id)
+            # rich only marks tasks finished through update, rows can also be added already complete
+            if row is not None and tasks[row].remaining == 0 and task_id not in self.finished: self.finished.append(task_id)
+        while len(self.rows) > self.window and self.finished:
+            self.progress.remove_task(self.rows.pop(self.finished.popleft()))
+        if self.batch is not None:
+            self.progress.update(self.batch, description=self.batch_description(), completed=self.done_files)
+
+    def batch_description(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.audio_done / elapsed if elapsed else 0
+        eta = timedelta(seconds=round(elapsed / self.done_files * (self.files - self.done_files))) if self.done_files else '?'
+        summary = f'{self.done_files}/{self.files} files, {rate:.1f} h/h, ETA {eta}'
+        return f'[bold magenta]batch[/bold magenta] | {summary.ljust(35)[:35]}'
+
+
+def make_progress(window: int = 0, files: int = 0) -> BatchProgress | NullProgress:
+    if simplens.events: return NullProgress()
+    return BatchProgress(window or math.inf, files)
+
+
+def createdir(out: str) -> None:
+    try:
+        os.makedirs(out, exist_ok=True)
+    except OSError:
+        print_exit('create_dir', out)
+
+
+@dataclass
+class TempTier:
+    path: str
+    reserve: int
+    budget: int | None = None
+    live: int = 0
+    pending: int = 0
+
+
+@dataclass
+class Intermediate:
+    fl: str
+    trackindex: int
+    key: str
+    wav_file: str
+    length: float
+    output_args: list[str]
+    output_args_print: str
+    exists: bool
+    stream: bool = False
+    borrowed: bool = False
+    reorder: bool = False
+    size: int = 0
+    tier: TempTier | None = None
+    consumers: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class Job:
+    intermediate: Intermediate
+    aformat: str
+    output: str
+    out_name: str
+    xml_file: str
+    dee_args: list[str]
+    dee_args_print: str
+    xml_base: dict[str, Any]
+    delay: str
+    segments: int = 1
+    dialnorm: int = 0
+    segment: Segment | None = None
+    queued: bool = False
+
+    @property
+    def output_path(self) -> str:
+        # segments end up in a single output
+        return self.segment.splice.output if self.segment else os.path.join(self.output, self.out_name)
+
+    @property
+    def given_dialnorm(self) -> int:
+        # the custom dialnorm DEE is handed, -dn can't be injected into AC-4 so it measures on its own
+        return self.dialnorm or (args.dialnorm if self.aformat != 'ac4' else 0)
+
+    @property
+    def measures(self) -> bool:
+        # follows the dialnorm the job actually gets, segments get theirs after the whole input is measured
+        return dee_measures(self.aformat, self.given_dialnorm)
+
+
+@dataclass
+class JobResult:
+    file: str
+    output: str
+    aformat: str
+    returncode: int | None
+    dialnorm: int | None
+    loudness: float | None
+    phases: dict[str, float]
+    seconds: float
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.error is None
+
+
+@dataclass
+class Splice:
+    output: str
+    segments: list[Segment]
+    remaining: int
+    returncode: int = 0
+    phases: dict[str, float] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class Segment:
+    start: int
+    end: int | None
+    skip: int
+    keep: int | None
+    part_file: str
+    splice: Splice
+
+
+@dataclass
+class Decode:
+    fl: str
+    length: float
+    intermediates: list[Intermediate]
+    ffmpeg_args: list[str]
+    ffmpeg_args_print: str
+
+
+def build_ffmpeg_output(wav_file: str, codec: str, resample_value: str, channels: int, trackindex: int, label: str) -> tuple[list[str], str]:
+    filters = []
+    if channels == 8: filters.append('pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5')
+    if resample_value: filters.append('aresample=resampler=soxr')
+
+    # filter outputs are labeled, so a single ffmpeg process can write several intermediates
+    if filters:
+        map_args = ['-map', f'[{label}]']
+        map_args_print = f'-map [bold color(231)]"\[{label}]"[/bold color(231)] '
+        filter_args = ['-filter_complex', f'[a:{trackindex}]{",".join(filters)}[{label}]']
+        filter_args_print = f'-filter_complex [bold color(231)]"\[a:{trackindex}]{",".join(filters)}\[{label}]"[/bold color(231)] '
+    else:
+        map_args = ['-map', f'0:a:{trackindex}']
+        map_args_print = '-map [bold color(231)]0:a[/bold color(231)]' + f'[bold color(231)]:{trackindex}[/bold color(231)] '
+        filter_args = []
+        filter_args_print = ''
+
     if resample_value:
-        if channels == 8:
-            channel_swap = 'pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5,'
-        else:
-            channel_swap = ''
         resample_args = [
-            '-filter_complex', f'[a:{trackindex}]{channel_swap}aresample=resampler=soxr',
             '-ar', resample_value,
             '-precision', '28',
             '-cutoff', '1',
             '-dither_scale', '0']
-        resample_args_print = f'-filter_complex [bold color(231)]"\[a:{trackindex}]{channel_swap}aresample=resampler=soxr"[/bold color(231)] \
--ar [bold color(231)]{resample_value}[/bold color(231)] \
+        resample_args_print = f'-ar [bold color(231)]{resample_value}[/bold color(231)] \
 -precision [bold color(231)]28[/bold color(231)] \
 -cutoff [bold color(231)]1[/bold color(231)] \
 -dither_scale [bold color(231)]0[/bold color(231)] '
@@ -867,154 +1077,1882 @@ def main() -> None:
         resample_args = []
         resample_args_print = ''
 
-    if channels == 8 and not resample_args:
-        channel_swap_args = ['-filter_complex', f'[a:{trackindex}]pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5']
-        channel_swap_args_print = f'-filter_complex [bold color(231)]"\[a:{trackindex}]pan=7.1|c0=c0|c1=c1|c2=c2|c3=c3|c4=c6|c5=c7|c6=c4|c7=c5"[/bold color(231)] '
+    output_args = [
+        *(map_args),
+        '-c', codec,
+        *(filter_args), *(resample_args),
+        '-rf64', 'always',
+        wav_file
+    ]
+
+    output_args_print = f'{map_args_print}\
+-c [bold color(231)]{codec}[/bold color(231)] \
+{filter_args_print}{resample_args_print}\
+-rf64 [bold color(231)]always[/bold color(231)] '
+
+    return output_args, output_args_print
+
+
+def build_ffmpeg_args(fl: str, intermediates: list[Intermediate]) -> tuple[list[str], str]:
+    ffmpeg_args = [
+        simplens.config['ffmpeg_path'],
+        '-y',
+        '-drc_scale', '0',
+        '-i', fl,
+    ]
+    for intermediate in intermediates: ffmpeg_args.extend(intermediate.output_args)
+
+    ffmpeg_args_print = f'[bold cyan]ffmpeg[/bold cyan] \
+-y \
+-drc_scale [bold color(231)]0[/bold color(231)] \
+-i [bold green]{fl}[/bold green] \
+{"".join(f"{i.output_args_print}[bold magenta]{i.wav_file}[/bold magenta] " for i in intermediates).rstrip()}'
+
+    return ffmpeg_args, ffmpeg_args_print
+
+
+def parse_cpu_list(cpu_list: str) -> list[int]:
+    cpus = []
+    for part in cpu_list.strip().split(','):
+        first, _, last = part.partition('-')
+        if first: cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def cpu_pairs(cpus: list[int]) -> list[list[int]]:
+    # SMT siblings first, then threads sharing an L2 cache, then whatever is left in order
+    def shared(cpu: int, name: str) -> list[int]:
+        try:
+            with open(f'/sys/devices/system/cpu/cpu{cpu}/{name}') as fd:
+                return parse_cpu_list(fd.read())
+        except (OSError, ValueError):
+            return [cpu]
+
+    pairs, left = [], sorted(cpus)
+    for name in ['topology/thread_siblings_list', 'cache/index2/shared_cpu_list']:
+        unpaired = []
+        while left:
+            cpu = left.pop(0)
+            partner = next((c for c in left if c in shared(cpu, name)), None)
+            if partner is None:
+                unpaired.append(cpu)
+            else:
+                left.remove(partner)
+                pairs.append([cpu, partner])
+        left = unpaired
+    pairs.extend(left[i:i + 2] for i in range(0, len(left), 2))
+    return pairs
+
+
+def lower_priority(pid: int) -> None:
+    # set once the process is running, the first few milliseconds still run at the normal priority
+    try:
+        if simplens.decode_nice: os.setpriority(os.PRIO_PROCESS, pid, simplens.decode_nice)
+        if simplens.decode_ionice: subprocess.run(['ionice', *simplens.decode_ionice, '-p', str(pid)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        pass
+
+
+def read_bytes(pid: int) -> int | None:
+    # what the process has read so far, mostly the input
+    try:
+        with open(f'/proc/{pid}/io') as fd:
+            return next(int(line.split()[1]) for line in fd if line.startswith('rchar:'))
+    except (OSError, StopIteration):
+        return None
+
+
+def decode(task_id: TaskID, dec: Decode) -> None:
+    pb = simplens.pb
+    fl_b = os.path.basename(dec.fl)
+    pb.update(description=f'[bold][cyan]starting[/cyan][/bold]...{" " * 24}', task_id=task_id, visible=True)
+
+    # -progress writes blocks of key=value lines, every block ends with a progress line
+    ffmpeg_args = [dec.ffmpeg_args[0], '-nostats', '-progress', 'pipe:1', *dec.ffmpeg_args[1:]]
+    ffmpeg = subprocess.Popen(ffmpeg_args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, encoding='utf-8', errors='ignore')
+    lower_priority(ffmpeg.pid)
+    started = time.monotonic()
+    emit('decode_started', file=dec.fl, outputs=[i.wav_file for i in dec.intermediates])
+    input_size = os.path.getsize(dec.fl)
+    pb.update(description=f'[bold][cyan]ffmpeg[/cyan][/bold] | {trim_names(fl_b, 6)}', task_id=task_id, total=100)
+    block, percent = {}, None
+    with ffmpeg.stdout:
+        for line in ffmpeg.stdout:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            if key != 'progress': continue
+
+            if dec.length != -1 and block.get('out_time_us', 'N/A') != 'N/A':
+                completed = int(block['out_time_us']) / 10000 / dec.length
+            elif (position := read_bytes(ffmpeg.pid)) is not None and input_size:
+                # no duration, how much of the input has been read is the next best thing
+                completed = position / input_size * 100
+            else:
+                completed = None
+            speed = block.get('speed', 'N/A').strip()
+            if speed == 'N/A': speed = f'{int(block.get("total_size", 0) or 0) / 1024 ** 2:.0f} MB'
+            pb.update(description=f'[bold][cyan]ffmpeg[/cyan][/bold] | {trim_names(fl_b, 9 + len(speed))} ({speed})', task_id=task_id,
+                      total=None if completed is None else 100, completed=clamp(completed or 0, 0, 99.9))
+            if completed is not None and int(completed) != percent:
+                percent = int(completed)
+                emit('decode_progress', file=dec.fl, percent=clamp(percent, 0, 99), speed=block.get('speed', 'N/A').strip())
+            block = {}
+    returncode = ffmpeg.wait()
+    emit('decode_finished', file=dec.fl, returncode=returncode, seconds=round(time.monotonic() - started, 3))
+    if returncode != 0:
+        pb.update(task_id=task_id, visible=False)
+        raise RuntimeError(f'ffmpeg couldn\'t decode {dec.fl} (exit code {returncode})')
+    pb.update(task_id=task_id, total=100, completed=100)
+    time.sleep(0.5)
+
+
+def link_input(fl: str, wav_file: str) -> str | None:
+    # DEE reads the input through a hardlink in the temp path, or from its own directory
+    # the link isn't an intermediate, its name keeps it out of the cache and its eviction
+    link = f'{os.path.splitext(wav_file)[0]}.input.wav'
+    try:
+        os.link(fl, link)
+        return link
+    except OSError:
+        # a Windows DEE under WSL only reaches the drives under /mnt/, the input gets decoded then
+        if simplens.is_nonnative_exe and not os.path.abspath(fl).startswith('/mnt/'): return None
+        return os.path.abspath(fl)
+
+
+def reorder_71(task_id: TaskID, intermediate: Intermediate) -> None:
+    import numpy as np
+
+    pb = simplens.pb
+    fl_b = os.path.basename(intermediate.fl)
+    pb.update(description=f'[bold][cyan]reorder[/cyan][/bold] | {trim_names(fl_b, 7)}', task_id=task_id, completed=0, total=100, visible=True)
+    fmt, offset, size = wav_layout(intermediate.fl)
+    block_align = int.from_bytes(fmt[12:14], 'little')
+    with open(intermediate.fl, 'rb') as fd:
+        header = bytearray(fd.read(offset))
+    # anything after the data chunk is left out, so the sizes in the header are fixed up
+    if header[0:4] == b'RIFF': header[4:8] = (offset + size - 8).to_bytes(4, 'little')
+    if header[12:16] == b'ds64': header[20:28] = (offset + size - 8).to_bytes(8, 'little')
+    with open(intermediate.wav_file, 'wb') as fd:
+        fd.write(header)
+        fd.truncate(offset + size)
+
+    # same swap as ffmpeg's pan filter, back and side channels trade places
+    source = np.memmap(intermediate.fl, dtype=np.uint8, mode='r', offset=offset, shape=(size // block_align, 8, block_align // 8))
+    target = np.memmap(intermediate.wav_file, dtype=np.uint8, mode='r+', offset=offset, shape=source.shape)
+    step = 1 << 16
+    for start in range(0, len(source), step):
+        target[start:start + step] = source[start:start + step][:, [0, 1, 2, 3, 6, 7, 4, 5]]
+        pb.update(task_id=task_id, completed=min(start + step, len(source)) / len(source) * 100)
+    target.flush()
+    del source, target
+    pb.update(task_id=task_id, completed=100)
+
+
+def measure(task_id: TaskID, job: Job) -> int:
+    pb = simplens.pb
+    pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(job.out_name, 12)}', task_id=task_id, completed=0, total=100, visible=True)
+    save_xml(job.xml_file, build_job_xml(job))
+    # it's a DEE instance like the encodes, so it counts against their limit
+    acquire_instance()
+    dee = None
+    try:
+        dee = subprocess.Popen(job.dee_args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, encoding='utf-8', errors='ignore')
+        log = DeeLog(measures=True)
+        measured_dn = None
+        with dee.stdout:
+            for line in dee.stdout:
+                event = log.feed(line)
+                if event == 'loudness':
+                    store_loudness(job, log.loudness)
+                    # a dialnorm of 0 would make DEE measure every segment on its own
+                    measured_dn = clamp(round(log.loudness), -31, -1)
+                    break
+                if event == 'progress': pb.update(task_id=task_id, completed=log.progress)
+    finally:
+        # the measurement ends with the loudness line, DEE would go on encoding
+        if dee:
+            if dee.poll() is None: dee.kill()
+            dee.wait()
+        release_instance()
+    record_dee_log(job, log)
+    if not args.keeptemp: os.remove(job.xml_file)
+    if measured_dn is None: raise RuntimeError(f'DEE didn\'t report the loudness of {job.intermediate.fl}')
+    pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(job.out_name, 18 + len(str(measured_dn)))} ({measured_dn} dB)', task_id=task_id, completed=100)
+    return measured_dn
+
+
+def split_job(job: Job, dialnorm: int) -> list[Job]:
+    config, plan = simplens.config, simplens.plan
+    fmt, offset, size = wav_layout(job.intermediate.wav_file)
+    samples = size // int.from_bytes(fmt[12:14], 'little')
+    frames = samples // 1536
+    # about 2 seconds of pre-roll and overlap on both sides, enough for the DRC and the transform windows to settle
+    roll = 64 * 1536
+    bounds = [round(frames * n / job.segments) * 1536 for n in range(job.segments + 1)]
+
+    output_keys = {'dd': 'ac3', 'ddp': 'ec3'}
+    xml_base = deepcopy(job.xml_base)
+    xml_base['job_config']['output'][output_keys[job.aformat]]['storage']['local']['path'] = wpc(config['temp_path'], quote=True)
+
+    splice = Splice(os.path.join(job.output, job.out_name), [], job.segments)
+    x = job.dee_args.index('-x') + 1
+    jobs = []
+    for n in range(job.segments):
+        start = max(0, bounds[n] - roll)
+        end = None if n == job.segments - 1 or bounds[n + 1] + roll >= samples else bounds[n + 1] + roll
+        out_name = f'{os.path.splitext(job.out_name)[0]}.part{n + 1}{os.path.splitext(job.out_name)[1]}'
+        xml_file = f'{os.path.splitext(job.xml_file)[0]}.part{n + 1}.xml'
+        dee_args = [*job.dee_args[:x], f'{plan.dee_xml_input_base}{os.path.basename(xml_file)}', *job.dee_args[x + 1:]]
+        segment = Segment(start, end, bounds[n] - start, None if n == job.segments - 1 else bounds[n + 1] - bounds[n], os.path.join(config['temp_path'], out_name), splice)
+        splice.segments.append(segment)
+        jobs.append(replace(job, output=config['temp_path'], out_name=out_name, xml_file=xml_file, dee_args=dee_args, xml_base=xml_base, dialnorm=dialnorm, segment=segment))
+
+    # every segment reads the same intermediate
+    with job.intermediate.lock:
+        job.intermediate.consumers += job.segments - 1
+    return jobs
+
+
+def access_units(data: bytes) -> list[tuple[int, int]]:
+    # offset and sample count of every AC-3 frame, E-AC-3 dependent substreams stay with their independent frame
+    ac3_frame_words = [64, 64, 80, 80, 96, 96, 112, 112, 128, 128, 160, 160, 192, 192, 224, 224, 256, 256, 320, 320,
+                       384, 384, 448, 448, 512, 512, 640, 640, 768, 768, 896, 896, 1024, 1024, 1152, 1152, 1280, 1280]
+    units = []
+    pos = 0
+    while pos + 6 <= len(data):
+        if data[pos:pos + 2] != b'\x0b\x77': raise ValueError(f'lost sync at byte {pos}')
+        if data[pos + 5] >> 3 <= 10:
+            if data[pos + 4] >> 6 != 0: raise ValueError('only 48 kHz AC-3 can be spliced')
+            size, samples, independent = ac3_frame_words[data[pos + 4] & 0x3f] * 2, 1536, True
+        else:
+            size = ((((data[pos + 2] & 0x07) << 8) | data[pos + 3]) + 1) * 2
+            samples = 1536 if data[pos + 4] >> 6 == 3 else 256 * [1, 2, 3, 6][(data[pos + 4] >> 4) & 0x03]
+            independent = data[pos + 2] >> 6 != 1 and (data[pos + 2] >> 3) & 0x07 == 0
+        if independent or not units: units.append((pos, samples))
+        pos += size
+    return units
+
+
+def splice_segments(splice: Splice) -> None:
+    # the pre-roll and overlap frames of each segment are dropped, the rest is concatenated
+    with open(splice.output, 'wb') as out:
+        for segment in splice.segments:
+            with open(segment.part_file, 'rb') as fd:
+                data = fd.read()
+            units = access_units(data)
+            position = 0
+            for (start, samples), end in zip(units, [u[0] for u in units[1:]] + [len(data)]):
+                if position >= segment.skip and (segment.keep is None or position < segment.skip + segment.keep):
+                    out.write(data[start:end])
+                position += samples
+    if not args.keeptemp:
+        for segment in splice.segments: os.remove(segment.part_file)
+
+
+def tier_fits(tier: TempTier, size: int) -> bool:
+    # bytes that are admitted but still being written don't show up in the free space yet
+    if tier.budget is not None and tier.live + size > tier.budget: return False
+    return size + tier.pending <= shutil.disk_usage(tier.path).free - tier.reserve
+
+
+def admit(file_plan: FilePlan) -> TempTier | None:
+    writes = [i for i in file_plan.intermediates if not i.exists and not i.stream]
+    size = sum(i.size for i in writes)
+    if not writes: return None
+
+    with simplens.temp_cond:
+        while True:
+            tier = next((t for t in simplens.temp_tiers if tier_fits(t, size)), None)
+            if tier: break
+            if not any(t.live or t.pending for t in simplens.temp_tiers):
+                # nothing of ours can be freed, waiting wouldn't help
+                raise PlanError('temp_space', f'{format_size(size)} for {os.path.basename(file_plan.fl)}')
+            # other programs can free space as well, so this doesn't only rely on being notified
+            simplens.temp_cond.wait(timeout=5)
+        tier.pending += size
+        if simplens.temp_releasable: tier.live += size
+
+    if tier is not simplens.temp_tiers[-1]:
+        for intermediate in writes:
+            intermediate.wav_file = os.path.join(tier.path, os.path.basename(intermediate.wav_file))
+            intermediate.output_args[-1] = intermediate.wav_file
+        if file_plan.decode: file_plan.decode.ffmpeg_args = build_ffmpeg_args(file_plan.fl, file_plan.decode.intermediates)[0]
+    for intermediate in writes: intermediate.tier = tier
+    return tier
+
+
+def settle(tier: TempTier | None, size: int) -> None:
+    if not tier: return
+    with simplens.temp_cond:
+        tier.pending -= size
+        simplens.temp_cond.notify_all()
+
+
+def release(intermediate: Intermediate) -> None:
+    if not intermediate.tier or not simplens.temp_releasable: return
+    with simplens.temp_cond:
+        intermediate.tier.live -= intermediate.size
+        simplens.temp_cond.notify_all()
+
+
+def prepare(file_plan: FilePlan, devices: list[int]) -> None:
+    pb = simplens.pb
+    try:
+        tier = admit(file_plan)
+    except PlanError:
+        free_devices(devices)
+        raise
+    try:
+        if file_plan.decode: decode(pb.add_task('', visible=False, total=None), file_plan.decode)
+        for intermediate in file_plan.intermediates:
+            if intermediate.reorder: reorder_71(pb.add_task('', visible=False, total=None), intermediate)
+    except Exception:
+        # none of the jobs get queued, decode_worker marks them failed
+        discard(file_plan)
+        raise
+    finally:
+        settle(tier, sum(i.size for i in file_plan.intermediates if i.tier))
+        free_devices(devices)
+
+    # segments are split before anything gets queued, a failed measurement leaves no job reading the intermediates
+    split, measured = [], {}
+    try:
+        for job in file_plan.jobs:
+            jobs = [job]
+            if job.segments > 1:
+                # the loudness of the whole input, so every segment gets the same dialnorm
+                key = job.intermediate.key
+                if key not in measured: measured[key] = args.dialnorm or job.dialnorm or measure(pb.add_task('', visible=False, total=None), job)
+                jobs = split_job(job, measured[key])
+            split.append((job, jobs))
+    except BaseException:
+        discard(file_plan)
+        raise
+
+    for job, jobs in split:
+        job.queued = True
+        # blocks while the encoders are behind, so decoding can't run too far ahead of them
+        for job in jobs:
+            task_id = pb.add_task('', visible=False, total=None)
+            emit('job_queued', job=task_id, file=job.intermediate.fl, format=job.aformat, output=os.path.join(job.output, job.out_name))
+            simplens.handoff.put((task_id, job))
+
+
+def discard(file_plan: FilePlan) -> None:
+    # what a failed decode, reorder or measurement left behind, nothing is going to read it
+    for intermediate in file_plan.intermediates:
+        if intermediate.borrowed:
+            # only the link in the temp path goes, never the input itself
+            if intermediate.wav_file != os.path.abspath(intermediate.fl) and os.path.lexists(intermediate.wav_file): os.remove(intermediate.wav_file)
+            continue
+        if intermediate.exists or intermediate.stream: continue
+        if os.path.exists(intermediate.wav_file): os.remove(intermediate.wav_file)
+        release(intermediate)
+
+
+def acquire_instance() -> None:
+    with simplens.instance_cond:
+        simplens.instance_cond.wait_for(lambda: simplens.running_instances < simplens.instance_limit)
+        simplens.running_instances += 1
+
+
+def release_instance() -> None:
+    with simplens.instance_cond:
+        simplens.running_instances -= 1
+        simplens.instance_cond.notify_all()
+
+
+def instance_controller(max_instances: int, stop: threading.Event) -> None:
+    cpus = simplens.cpus
+    while not stop.wait(5):
+        load = os.getloadavg()[0] / cpus
+        cpu_pressure, memory_pressure = read_pressure('cpu'), read_pressure('memory')
+        headroom = memory_headroom()
+        limit = simplens.instance_limit
+        if load > 1.2 or cpu_pressure > 40 or memory_pressure > 10 or headroom < dee_instance_memory:
+            limit -= 1
+        elif load < 0.8 and cpu_pressure < 20 and memory_pressure < 1 and headroom > 2 * dee_instance_memory:
+            limit += 1
+        with simplens.instance_cond:
+            simplens.instance_limit = clamp(limit, 1, max_instances)
+            simplens.instance_cond.notify_all()
+
+
+def decode_devices(file_plan: FilePlan) -> list[int]:
+    if not file_plan.decode and not any(i.reorder and not i.exists for i in file_plan.intermediates): return []
+    return list({os.stat(file_plan.fl).st_dev, simplens.temp_dev})
+
+
+def claim_devices(devices: list[int], item: tuple[float, int, FilePlan]) -> bool:
+    limits = simplens.device_limits
+    with simplens.device_lock:
+        busy = [d for d in devices if 0 < limits.get(d, simplens.device_decode_instances) <= simplens.device_busy.get(d, 0)]
+        if busy:
+            # parked until a decode on that drive finishes, the decoder picks a file from another drive meanwhile
+            simplens.parked.setdefault(busy[0], []).append(item)
+            return False
+        for d in devices: simplens.device_busy[d] = simplens.device_busy.get(d, 0) + 1
+        return True
+
+
+def free_devices(devices: list[int]) -> None:
+    with simplens.device_lock:
+        for d in devices:
+            simplens.device_busy[d] -= 1
+            for item in simplens.parked.pop(d, []): simplens.dispatch.put(item)
+
+
+def decode_worker(errors: list[BaseException]) -> None:
+    while (item := simplens.dispatch.get())[2] is not None:
+        file_plan = item[2]
+        devices = decode_devices(file_plan)
+        if not claim_devices(devices, item): continue
+        # a worker that dies leaves the others waiting for it, so even an exit ends up as a failed result
+        try:
+            prepare(file_plan, devices)
+        except BaseException as e:
+            emit('decode_failed', file=file_plan.fl, error=str(e))
+            errors.append(e)
+            for job in file_plan.jobs:
+                if not job.queued: record_result(job, None, error=str(e))
+
+
+def encode_worker(errors: list[BaseException], cpus: list[int] | None) -> None:
+    while (task_job := simplens.handoff.get()) is not None:
+        acquire_instance()
+        try:
+            encode(*task_job, cpus)
+        except BaseException as e:
+            emit('job_failed', job=task_job[0], error=str(e))
+            errors.append(e)
+            record_result(task_job[1], None, error=str(e))
+        finally:
+            release_instance()
+
+
+def encode(task_id: TaskID, job: Job, cpus: list[int] | None = None) -> None:
+    pb = simplens.pb
+    intermediate, aformat = job.intermediate, job.aformat
+    wav_file = intermediate.wav_file
+    out_b = job.out_name
+    pb.update(description=f'[bold][cyan]starting[/cyan][/bold]...{" " * 24}', task_id=task_id, visible=True)
+    save_xml(job.xml_file, build_job_xml(job))
+
+    if intermediate.stream:
+        if os.path.lexists(wav_file): os.remove(wav_file)
+        os.mkfifo(wav_file)
+        ffmpeg = subprocess.Popen(build_ffmpeg_args(intermediate.fl, [intermediate])[0], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    if job.given_dialnorm:
+        # a custom, cached or whole input dialnorm is used, whatever DEE measures on its own
+        dialnorm = str(job.given_dialnorm)
+        pb.update(description=f'[bold cyan]DEE[/bold cyan]: encode | {trim_names(out_b, 17 + len(dialnorm))} ({dialnorm} dB)', task_id=task_id, completed=0, total=100)
+    elif not job.measures:
+        pb.update(description=f'[bold cyan]DEE[/bold cyan]: encode | {trim_names(out_b, 11)}', task_id=task_id, completed=0, total=100)
     else:
-        channel_swap_args = []
-        channel_swap_args_print = ''
+        pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(out_b, 12)}', task_id=task_id, completed=0, total=100)
+    dee = subprocess.Popen(job.dee_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, encoding='utf-8', errors='ignore')
+    # set right after the start, so the threads DEE creates inherit it
+    # DEE may already be gone or the cpus may have been taken from us since planning, it runs unpinned then
+    try:
+        if cpus: os.sched_setaffinity(dee.pid, cpus)
+    except OSError:
+        pass
+    if intermediate.stream:
+        # if ffmpeg dies before opening the pipe, DEE would wait for a writer forever
+        def watch_ffmpeg():
+            if ffmpeg.wait() != 0 and dee.poll() is None: dee.kill()
+        threading.Thread(target=watch_ffmpeg, daemon=True).start()
+    # the measuring pass of DEE 5.2 and up is the first quarter of the bar
+    log = DeeLog(job.measures, 0.25 if aformat != 'thd' else 1.0)
+    output = os.path.join(job.output, job.out_name)
+    emit('job_started', job=task_id, file=intermediate.fl, output=output, cpus=cpus)
+    phase, percent = log.phase, None
+    with dee.stdout:
+        for line in dee.stdout:
+            event = log.feed(line)
+            if log.phase != phase:
+                phase = log.phase
+                emit('stage', job=task_id, stage=phase)
+            if event == 'progress':
+                pb.update(task_id=task_id, completed=log.progress)
+                if int(log.progress) != percent:
+                    percent = int(log.progress)
+                    emit('progress', job=task_id, percent=percent)
+            elif event == 'loudness':
+                emit('loudness', job=task_id, loudness=log.loudness, dialnorm=job.given_dialnorm or clamp(round(log.loudness), -31, 0))
+                if not job.dialnorm and args.dialnorm == 0: store_loudness(job, log.loudness)
+                measured_dn = str(clamp(round(log.loudness), -31, 0))
+                if args.measure_only:
+                    add_measurement(intermediate.fl, intermediate.trackindex, log.loudness)
+                    pb.update(description=f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(out_b, 18 + len(measured_dn))} ({measured_dn} dB)', task_id=task_id, completed=100)
+                    dee.kill()
+                elif not job.given_dialnorm:
+                    pb.update(description=f'[bold cyan]DEE[/bold cyan]: encode | {trim_names(out_b, 17 + len(measured_dn))} ({measured_dn} dB)', task_id=task_id)
+            elif event == 'error':
+                oprint(line.rstrip().split(': ', 1)[-1])
+    returncode = dee.wait()
+    phases = record_dee_log(job, log)
+    emit('job_finished', job=task_id, output=output, returncode=returncode, loudness=log.loudness, phases=phases, seconds=round(sum(phases.values()), 3))
+    pb.update(task_id=task_id, completed=100)
 
-    if simplens.is_nonnative_exe:
-        dee_xml_input_base = wpc(config['temp_path'])
+    if intermediate.stream:
+        # DEE is done with the pipe, ffmpeg can't be waiting for anything else
+        if ffmpeg.poll() is None: ffmpeg.kill()
+        ffmpeg.wait()
+        os.remove(wav_file)
+
+    with intermediate.lock:
+        intermediate.consumers -= 1
+        last_consumer = intermediate.consumers == 0
+
+    if not args.keeptemp:
+        if last_consumer and (intermediate.borrowed or not simplens.cache_budget) and not (intermediate.borrowed and wav_file == os.path.abspath(intermediate.fl)):
+            del_time = 0
+            while os.path.exists(wav_file) and del_time < 10:
+                try:
+                    os.remove(wav_file)
+                except PermissionError:
+                    # likely dee still use it
+                    del_time += 1
+                    time.sleep(1)
+
+            if os.path.exists(wav_file):
+                print(f'[bold yellow]Failed to delete:[/bold yellow] {wav_file}')
+            release(intermediate)
+        os.remove(job.xml_file)
+
+    if aformat == 'thd':
+        os.remove(os.path.join(job.output, f'{job.out_name}.log'))
+        os.remove(os.path.join(job.output, f'{job.out_name}.mll'))
+
+    # killing DEE is how a measurement ends
+    if args.measure_only and log.loudness is not None: returncode = 0
+    if job.segment:
+        splice = job.segment.splice
+        with splice.lock:
+            splice.remaining -= 1
+            last_segment = splice.remaining == 0
+            splice.returncode = splice.returncode or returncode
+            for phase, seconds in phases.items(): splice.phases[phase] = round(splice.phases.get(phase, 0) + seconds, 3)
+        if last_segment:
+            splice_segments(splice)
+            record_result(job, splice.returncode, log.loudness, splice.phases)
+            job_done(job)
     else:
-        dee_xml_input_base = config['temp_path'] if config['temp_path'].endswith('/') else f'{config["temp_path"]}/'
+        record_result(job, returncode, log.loudness, phases)
+        job_done(job)
+
+
+class PlanError(Exception):
+    def __str__(self) -> str:
+        return plain(error_text(*self.args))
+
+
+@dataclass
+class DeeLog:
+    # DEE goes through startup, an optional measuring pass, the encode and finalising the output
+    measures: bool
+    measure_scale: float = 1.0
+    phase: str = 'startup'
+    phases: dict[str, float] = field(default_factory=lambda: {'startup': time.monotonic()})
+    loudness: float | None = None
+    progress: float = 0.0
+    finished: bool = False
+
+    def enter(self, phase: str) -> None:
+        self.phase = phase
+        self.phases[phase] = time.monotonic()
+
+    def feed(self, line: str) -> str | None:
+        progress = dee_progress_re.search(line)
+        if progress:
+            value = float(progress[1])
+            if self.phase == 'startup': self.enter('measure' if self.measures else 'encode')
+            if self.phase == 'measure' and self.finished and value < 100:
+                # a new stage without a loudness line, the measuring pass is over
+                self.enter('encode')
+            self.finished = value == 100
+            if self.finished:
+                if self.phase == 'encode': self.enter('finalise')
+                return None
+            self.progress = value * self.measure_scale if self.phase == 'measure' else value
+            return 'progress'
+        if self.loudness is None:
+            loudness = dee_loudness_re.search(line)
+            if loudness:
+                self.loudness = float(loudness[1])
+                if self.phase in ['startup', 'measure']: self.enter('encode')
+                return 'loudness'
+        if dee_error_re.search(line): return 'error'
+        return None
+
+    def durations(self) -> dict[str, float]:
+        self.enter('done')
+        stamps = list(self.phases.items())
+        return {phase: round(stamps[n + 1][1] - start, 3) for n, (phase, start) in enumerate(stamps[:-1])}
+
+
+def record_result(job: Job, returncode: int | None, loudness: float | None = None, phases: dict[str, float] | None = None, error: str | None = None) -> None:
+    phases = phases or {}
+    dialnorm = job.given_dialnorm or (clamp(round(loudness), -31, 0) if loudness is not None else None)
+    result = JobResult(job.intermediate.fl, job.output_path, job.aformat, returncode, dialnorm, loudness, phases, round(sum(phases.values()), 3), error)
+    with simplens.cache_lock:
+        simplens.results.append(result)
+    emit('job_result', **asdict(result))
+
+
+def record_dee_log(job: Job, log: DeeLog) -> dict[str, float]:
+    durations = log.durations()
+    with simplens.cache_lock:
+        simplens.dee_logs.append({'file': job.intermediate.fl, 'output': job.out_name, 'loudness': log.loudness, **durations})
+    return durations
+
+
+@dataclass
+class FilePlan:
+    fl: str
+    cost: float
+    costs: list[float]
+    intermediates: list[Intermediate]
+    jobs: list[Job]
+    decode: Decode | None
+    exists: bool
+    temp_size: int = 0
+
+
+def cgroup_paths() -> list[str]:
+    # the cgroup v2 group of this process and its parents, nearest first
+    root = next((r for r in ['/sys/fs/cgroup', '/sys/fs/cgroup/unified'] if os.path.exists(os.path.join(r, 'cgroup.controllers'))), None)
+    try:
+        with open('/proc/self/cgroup') as fd:
+            path = next(line.split(':', 2)[2].strip() for line in fd if line.startswith('0::'))
+    except (OSError, StopIteration):
+        return []
+    if not root: return []
+    groups = [os.path.join(root, path.lstrip('/'))]
+    while path not in ['/', '']:
+        path = os.path.dirname(path)
+        groups.append(os.path.join(root, path.lstrip('/')))
+    return groups
+
+
+def read_cgroup(name: str) -> list[str]:
+    # limits of parent groups apply as well, so every group that has the file is returned
+    contents = []
+    for group in simplens.cgroups:
+        try:
+            with open(os.path.join(group, name)) as fd:
+                contents.append(fd.read())
+        except OSError:
+            continue
+    return contents
+
+
+def available_cpus() -> int:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quotas = [int(quota) / int(period) for quota, period in map(str.split, read_cgroup('cpu.max')) if quota != 'max']
+    if quotas: cpus = min(cpus, max(1, math.ceil(min(quotas))))
+    return cpus
 
-    xml_validation = [] if simplens.dee_is_exe else ['--disable-xml-validation']
-    xml_validation_print = '' if simplens.dee_is_exe else ' --disable-xml-validation'
 
-    if '-filter_complex' in resample_args or '-filter_complex' in channel_swap_args:
-        map_args = []
-        map_args_print = ''
+def memory_limit() -> int | None:
+    limits = [int(limit) for limit in read_cgroup('memory.max') if limit.strip() != 'max']
+    return min(limits) if limits else None
+
+
+def memory_headroom() -> float:
+    limit = memory_limit()
+    if limit:
+        current = read_cgroup('memory.current')
+        if current: return limit - int(current[0])
+    try:
+        with open('/proc/meminfo') as fd:
+            return next(int(line.split()[1]) * 1024 for line in fd if line.startswith('MemAvailable:'))
+    except (OSError, StopIteration):
+        return math.inf
+
+
+def read_pressure(resource: str) -> float:
+    # the share of time some tasks were stalled in the last 10 seconds, in percent
+    pressure = next(iter(read_cgroup(f'{resource}.pressure')), None)
+    if pressure is None:
+        try:
+            with open(f'/proc/pressure/{resource}') as fd:
+                pressure = fd.read()
+        except OSError:
+            return 0.0
+    avg10 = re.search(r'some avg10=([0-9.]+)', pressure)
+    return float(avg10[1]) if avg10 else 0.0
+
+
+def open_cache(cache_dir: str) -> sqlite3.Connection | None:
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        db = sqlite3.connect(os.path.join(cache_dir, 'cache.sqlite3'), check_same_thread=False)
+        db.execute('PRAGMA journal_mode = WAL')
+        # probe results of older versions lack fields, they just get probed again
+        if db.execute('PRAGMA user_version').fetchone()[0] != 2:
+            db.execute('DROP TABLE IF EXISTS streams')
+            db.execute('PRAGMA user_version = 2')
+        db.execute('''CREATE TABLE IF NOT EXISTS streams (
+            path TEXT, size INTEGER, mtime_ns INTEGER, track INTEGER,
+            samplerate INTEGER, channels INTEGER, bit_depth INTEGER, length REAL, codec TEXT, container TEXT,
+            PRIMARY KEY (path, size, mtime_ns, track))''')
+        db.execute('''CREATE TABLE IF NOT EXISTS loudness (
+            key TEXT, metering TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, loudness REAL,
+            PRIMARY KEY (key, metering))''')
+        db.execute('''CREATE TABLE IF NOT EXISTS binaries (
+            path TEXT, size INTEGER, mtime_ns INTEGER, version TEXT, is_exe INTEGER,
+            PRIMARY KEY (path, size, mtime_ns))''')
+        db.execute('CREATE TABLE IF NOT EXISTS releases (repo TEXT PRIMARY KEY, tag TEXT, checked REAL)')
+        db.execute('CREATE TABLE IF NOT EXISTS rates (dee_version TEXT PRIMARY KEY, rate REAL, startup REAL, overhead REAL)')
+    except (OSError, sqlite3.Error):
+        return None
+    return db
+
+
+def prune_cache(db: sqlite3.Connection | None) -> NoReturn:
+    stale = []
+    if db:
+        identities = db.execute('SELECT path, size, mtime_ns FROM streams UNION SELECT path, size, mtime_ns FROM loudness \
+UNION SELECT path, size, mtime_ns FROM binaries').fetchall()
+        for path, size, mtime_ns in identities:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stale.append((path, size, mtime_ns))
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns): stale.append((path, size, mtime_ns))
+        db.executemany('DELETE FROM streams WHERE path = ? AND size = ? AND mtime_ns = ?', stale)
+        db.executemany('DELETE FROM loudness WHERE path = ? AND size = ? AND mtime_ns = ?', stale)
+        db.executemany('DELETE FROM binaries WHERE path = ? AND size = ? AND mtime_ns = ?', stale)
+        db.commit()
+        db.execute('VACUUM')
+    print(f'Removed [bold yellow]{len(stale)}[/bold yellow] stale file(s) from the cache.')
+    sys.exit(0)
+
+
+def loudness_metering(xml_base: dict[str, Any]) -> str | None:
+    # the measurement depends on these settings, AC-4 has no custom dialnorm to inject the result into
+    audio_filter = xml_base['job_config']['filter']['audio']
+    if 'pcm_to_ddp' in audio_filter:
+        metering = {**audio_filter['pcm_to_ddp']['loudness']['measure_only'], 'downmix': audio_filter['pcm_to_ddp']['downmix_config']}
+    elif 'encode_to_dthd' in audio_filter:
+        metering = audio_filter['encode_to_dthd']['loudness_measurement']
     else:
-        map_args = ['-map', f'0:a:{trackindex}']
-        map_args_print = '-map [bold color(231)]0:a[/bold color(231)]' + f'[bold color(231)]:{trackindex}[/bold color(231)] '
+        return None
+    return json.dumps(metering, sort_keys=True)
 
-    settings = []
-    ffmpeg_print_list = []
-    dee_print_list = []
-    intermediate_exists_list = []
-    for i in range(len(filelist)):
-        dee_xml_input = f'{dee_xml_input_base}{basename(filelist[i], "xml", sanitize=True)}'
-
-        ffmpeg_args = [
-            config['ffmpeg_path'],
-            '-y',
-            '-drc_scale', '0',
-            '-i', filelist[i],
-            *(map_args),
-            '-c', f'pcm_s{bit_depth}le',
-            *(channel_swap_args), *(resample_args),
-            '-rf64', 'always',
-            os.path.join(config['temp_path'], basename(filelist[i], 'wav'))
-        ]
-        dee_args = [
-            config['dee_path'],
-            '--progress-interval', '500',
-            '--diagnostics-interval', '90000',
-            '-x', dee_xml_input,
-            *(xml_validation)
-        ]
-
-        ffmpeg_args_print = f'[bold cyan]ffmpeg[/bold cyan] \
--y \
--drc_scale [bold color(231)]0[/bold color(231)] \
--i [bold green]{filelist[i]}[/bold green] \
-{map_args_print}\
--c [bold color(231)]pcm_s{bit_depth}le[/bold color(231)] \
-{channel_swap_args_print}{resample_args_print}\
--rf64 [bold color(231)]always[/bold color(231)] \
-[bold magenta]{os.path.join(config["temp_path"], basename(filelist[i], "wav"))}[/bold magenta]'
 
-        ffmpeg_args_print_short = f'[bold cyan]ffmpeg[/bold cyan] \
--y \
--drc_scale [bold color(231)]0[/bold color(231)] \
--i [bold green]\[input][/bold green] \
-{map_args_print}\
--c [bold color(231)]pcm_s{bit_depth}le[/bold color(231)] \
-{channel_swap_args_print}{resample_args_print}\
--rf64 [bold color(231)]always[/bold color(231)] \
-[bold magenta]\[output][/bold magenta]'
+def cached_loudness(key: str, xml_base: dict[str, Any]) -> float | None:
+    db, metering = simplens.cache, loudness_metering(xml_base)
+    if not db or not metering or args.dialnorm != 0 or args.invalidate_loudness: return None
+    try:
+        with simplens.cache_lock:
+            row = db.execute('SELECT loudness FROM loudness WHERE key = ? AND metering = ?', (key, metering)).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def binary_info(binary: str, version_args: list[str]) -> tuple[str, bool]:
+    # the version banner and the MZ header only change with the binary itself, so they're not read on every run
+    path = os.path.realpath(shutil.which(binary))
+    stat = os.stat(path)
+    identity = (path, stat.st_size, stat.st_mtime_ns)
+    db = simplens.cache
+    try:
+        if db:
+            with simplens.cache_lock:
+                row = db.execute('SELECT version, is_exe FROM binaries WHERE path = ? AND size = ? AND mtime_ns = ?', identity).fetchone()
+            if row: return row[0], bool(row[1])
+    except sqlite3.Error:
+        pass
+
+    with open(path, 'rb') as fd:
+        is_exe = fd.read(2) == b'\x4d\x5a'
+    v = parse_version_string([binary, *version_args])
+    if not db or v.startswith('[red]'): return v, is_exe
+    try:
+        with simplens.cache_lock:
+            db.execute('INSERT OR REPLACE INTO binaries VALUES (?, ?, ?, ?, ?)', (*identity, v, is_exe))
+            db.commit()
+    except sqlite3.Error:
+        pass
+    return v, is_exe
+
 
-        dee_args_print = f'[bold cyan]dee[/bold cyan] -x [bold magenta]{dee_xml_input}[/bold magenta]{xml_validation_print}'
-        dee_args_print_short = f'[bold cyan]dee[/bold cyan] -x [bold magenta]\[input][/bold magenta]{xml_validation_print}'
+def check_latest_version(ttl: float, timeout: float) -> None:
+    # runs next to the planning, failed lookups get cached too so offline machines don't retry every run
+    db, repo = simplens.cache, 'pcroland/deew'
+    try:
+        if db:
+            with simplens.cache_lock:
+                row = db.execute('SELECT tag, checked FROM releases WHERE repo = ?', (repo,)).fetchone()
+            if row and 0 <= time.time() - row[1] < ttl:
+                simplens.latest_version = row[0]
+                return
+    except sqlite3.Error:
+        pass
+
+    import requests
+    try:
+        r = requests.get(f'https://api.github.com/repos/{repo}/releases/latest', timeout=timeout)
+        simplens.latest_version = json.loads(r.text)['tag_name']
+    except Exception:
+        simplens.latest_version = None
+    if not db: return
+    try:
+        with simplens.cache_lock:
+            db.execute('INSERT OR REPLACE INTO releases VALUES (?, ?, ?)', (repo, simplens.latest_version, time.time()))
+            db.commit()
+    except sqlite3.Error:
+        pass
 
-        intermediate_exists = False
-        if os.path.exists(os.path.join(config['temp_path'], basename(filelist[i], 'wav'))):
-            intermediate_exists = True
-            ffmpeg_args_print = '[green]Intermediate already exists[/green]'
 
-        ffmpeg_print_list.append(ffmpeg_args_print)
-        dee_print_list.append(dee_args_print)
-        if intermediate_exists: intermediate_exists_list.append(os.path.basename(filelist[i]))
+def dee_rate() -> tuple[float, float, float]:
+    db = simplens.cache
+    try:
+        if db:
+            with simplens.cache_lock:
+                row = db.execute('SELECT rate, startup, overhead FROM rates WHERE dee_version = ?', (simplens.dee_version,)).fetchone()
+            if row: return row
+    except sqlite3.Error:
+        pass
+    return dee_rate_guess
+
+
+def store_dee_rate(file_plans: list[FilePlan], instances: int, dee_logs: list[dict[str, Any]], elapsed: float) -> None:
+    # averaged with the earlier runs, a single batch can be skewed by what else was running
+    db = simplens.cache
+    cost = sum(p.cost for p in file_plans)
+    seconds = sum(log.get(phase, 0) for log in dee_logs for phase in ['measure', 'encode', 'finalise'])
+    if not db or not dee_logs or cost <= 0 or seconds <= 0: return
+    rate, startup = cost / seconds, sum(log.get('startup', 0) for log in dee_logs) / len(dee_logs)
+    # the rest of the run measured against what the encodes alone would have taken with this run's timings
+    overhead = elapsed / encode_makespan(file_plans, instances, rate, startup)
+    try:
+        with simplens.cache_lock:
+            row = db.execute('SELECT rate, startup, overhead FROM rates WHERE dee_version = ?', (simplens.dee_version,)).fetchone()
+            if row: rate, startup, overhead = (row[0] + rate) / 2, (row[1] + startup) / 2, (row[2] + overhead) / 2
+            db.execute('INSERT OR REPLACE INTO rates VALUES (?, ?, ?, ?)', (simplens.dee_version, rate, startup, overhead))
+            db.commit()
+    except sqlite3.Error:
+        pass
+
+
+def store_loudness(job: Job, loudness: float) -> None:
+    db, metering = simplens.cache, loudness_metering(job.xml_base)
+    if not db or not metering: return
+    try:
+        stat = os.stat(job.intermediate.fl)
+        with simplens.cache_lock:
+            db.execute('INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?, ?)',
+                       (job.intermediate.key, metering, os.path.abspath(job.intermediate.fl), stat.st_size, stat.st_mtime_ns, loudness))
+            db.commit()
+    except (OSError, sqlite3.Error):
+        pass
+
+
+def probe_streams(fl: str) -> list[dict[str, Any]]:
+    db = None if args.no_probe_cache else simplens.cache
+    if db:
+        try:
+            stat = os.stat(fl)
+        except OSError:
+            # broken links and files that are gone by now, ffprobe couldn't read them either
+            raise PlanError('ffprobe')
+        identity = (os.path.abspath(fl), stat.st_size, stat.st_mtime_ns)
+        try:
+            with simplens.cache_lock:
+                rows = db.execute('SELECT track, samplerate, channels, bit_depth, length, codec, container FROM streams \
+WHERE path = ? AND size = ? AND mtime_ns = ? ORDER BY track', identity).fetchall()
+        except sqlite3.Error:
+            rows = []
+        if rows: return [dict(zip(['trackindex', 'samplerate', 'channels', 'bit_depth', 'length', 'codec', 'container'], row)) for row in rows]
+
+    # every audio stream is probed at once, so selecting several tracks costs a single ffprobe
+    probe_args = [simplens.config["ffprobe_path"], '-v', 'quiet', '-select_streams', 'a', '-print_format', 'json', '-show_format', '-show_streams', fl]
+    try:
+        output = subprocess.check_output(probe_args, encoding='utf-8')
+    except subprocess.CalledProcessError:
+        raise PlanError('ffprobe')
 
-        delay_in_filename = re.match(r'.+DELAY ([-|+]?[0-9]+m?s)\..+', filelist[i])
-        if delay_in_filename:
-            delay = delay_in_filename[1]
-            if not delay.startswith(('-', '+')):
-                delay = f'+{delay}'
+    streams = []
+    probed = json.loads(output)
+    for t, audio in enumerate(probed['streams']):
+        depth = int(audio.get('bits_per_sample', 0))
+        if depth == 0: depth = int(audio.get('bits_per_raw_sample', 32))
+        streams.append({
+            'trackindex': t,
+            'samplerate': int(audio['sample_rate']),
+            'channels': audio['channels'],
+            'bit_depth': depth,
+            'length': float(audio.get('duration', -1)),
+            'codec': audio.get('codec_name', ''),
+            'container': probed.get('format', {}).get('format_name', ''),
+        })
+    if not streams: raise PlanError('ffprobe')
+
+    if db:
+        # older entries of the same path can't be hit anymore
+        try:
+            with simplens.cache_lock:
+                db.execute('DELETE FROM streams WHERE path = ?', identity[:1])
+                db.executemany('INSERT INTO streams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               [(*identity, *(s[k] for k in ['trackindex', 'samplerate', 'channels', 'bit_depth', 'length', 'codec', 'container'])) for s in streams])
+                db.commit()
+        except sqlite3.Error:
+            pass
+    return streams
+
+
+def probe(fl: str, trackindexes: list[int] | None) -> list[dict[str, Any]]:
+    streams = probe_streams(fl)
+    sources = []
+    for t in range(len(streams)) if trackindexes is None else trackindexes:
+        if t >= len(streams): raise PlanError('track_missing', f'{t}[/bold yellow] in [bold yellow]{fl}')
+        sources.append(streams[t])
+    return sources
+
+
+def probe_worker(trackindexes: list[int] | None) -> None:
+    while not simplens.probe_stop.is_set():
+        try:
+            fl = simplens.unprobed.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            simplens.probed.put((fl, probe(fl, trackindexes)))
+        except Exception as e:
+            # every input has to show up, main() waits for as many results as there are inputs
+            simplens.probed.put((fl, e))
+
+
+def build_job_xml(job: Job) -> dict[str, Any]:
+    output_keys = {'dd': 'ac3', 'ddp': 'ec3', 'ac4': 'ac4', 'thd': 'mlp'}
+    filter_keys = {'dd': 'pcm_to_ddp', 'ddp': 'pcm_to_ddp', 'ac4': 'encode_to_ims_ac4', 'thd': 'encode_to_dthd'}
+    xml = deepcopy(job.xml_base)
+    xml['job_config']['input']['audio']['wav']['file_name'] = f'\"{os.path.basename(job.intermediate.wav_file)}\"'
+    xml['job_config']['input']['audio']['wav']['storage']['local']['path'] = wpc(os.path.dirname(job.intermediate.wav_file), quote=True)
+    xml['job_config']['output'][output_keys[job.aformat]]['file_name'] = f'\"{job.out_name}\"'
+    delay_print, delay_xml, delay_mode = convert_delay_to_ms(job.delay, compensate=job.aformat != 'thd')
+    xml['job_config']['filter']['audio'][filter_keys[job.aformat]][delay_mode] = delay_xml
+    if job.dialnorm: xml['job_config']['filter']['audio'][filter_keys[job.aformat]]['custom_dialnorm'] = job.dialnorm
+    if job.segment:
+        # segments are only made without a delay, so the 256 sample compensation is the only offset
+        xml['job_config']['filter']['audio']['pcm_to_ddp']['start'] = timestamp((job.segment.start + 256) / 48000)
+        if job.segment.end: xml['job_config']['filter']['audio']['pcm_to_ddp']['end'] = timestamp((job.segment.end + 256) / 48000)
+    return xml
+
+
+def get_layout(source: dict[str, Any]) -> SimpleNamespace:
+    plan = simplens.plan
+    layout_key = (source['samplerate'], source['channels'], source['bit_depth'])
+    if layout_key in plan.layouts: return plan.layouts[layout_key]
+
+    samplerate, channels, bit_depth = layout_key
+    if bit_depth not in [16, 24, 32]:
+        if bit_depth < 16:
+            bit_depth = 16
+        elif 16 < bit_depth < 24:
+            bit_depth = 24
         else:
-            delay = '+0ms'
-        if args.delay:
-            delay = args.delay
+            bit_depth = 32
 
-        xml = deepcopy(xml_base)
-        xml['job_config']['input']['audio']['wav']['file_name'] = basename(filelist[i], 'wav', quote=True)
-        if aformat == 'ddp':
-            xml['job_config']['output']['ec3']['file_name'] = basename(filelist[i], 'ec3', quote=True, stripdelay=True)
-            if bitrate > 1024:
-                xml['job_config']['output']['ec3']['file_name'] = basename(filelist[i], 'eb3', quote=True, stripdelay=True)
-            if args.force_standard:
-                xml['job_config']['output']['ec3']['file_name'] = basename(filelist[i], 'ec3', quote=True, stripdelay=True)
-            if args.force_bluray:
-                xml['job_config']['output']['ec3']['file_name'] = basename(filelist[i], 'eb3', quote=True, stripdelay=True)
-        elif aformat == 'dd':
-            xml['job_config']['output']['ec3']['file_name'] = basename(filelist[i], 'ac3', quote=True, stripdelay=True)
-            xml['job_config']['output']['ac3'] = xml['job_config']['output']['ec3']
-            del xml['job_config']['output']['ec3']
-        elif aformat == 'ac4':
-            xml['job_config']['output']['ac4']['file_name'] = basename(filelist[i], 'ac4', quote=True, stripdelay=True)
+    if channels not in [1, 2, 6, 8]: raise PlanError('channels')
+
+    # every format/bitrate combination is a separate DEE job on the same intermediate
+    # in a mixed batch a layout gets what can be made from it, the rest is reported and skipped
+    deliverables, skipped = [], []
+    for aformat in plan.formats:
+        if aformat == 'ac4' and channels != 6:
+            skipped.append('AC4 (needs 5.1)')
+            continue
+        if aformat == 'thd' and channels == 1:
+            skipped.append('TrueHD (needs 2.0, 5.1 or 7.1)')
+            continue
+        # the downmix only applies to inputs with more channels
+        format_downmix = plan.downmix if plan.downmix and plan.downmix < channels else None
+        if not format_downmix and aformat == 'dd' and channels == 8: format_downmix = 6
+        if aformat == 'ac4': format_downmix = 2
+
+        downmix_config = 'off'
+        if format_downmix:
+            outchannels = format_downmix
+            downmix_config = channel_number_to_name(outchannels)
         else:
-            xml['job_config']['output']['mlp']['file_name'] = basename(filelist[i], 'thd', quote=True, stripdelay=True)
-
-        if aformat in ['dd', 'ddp']:
-            delay_print, delay_xml, delay_mode = convert_delay_to_ms(delay, compensate=True)
-            xml['job_config']['filter']['audio']['pcm_to_ddp'][delay_mode] = delay_xml
-        elif aformat in ['ac4']:
-            delay_print, delay_xml, delay_mode = convert_delay_to_ms(delay, compensate=True)
-            xml['job_config']['filter']['audio']['encode_to_ims_ac4'][delay_mode] = delay_xml
+            outchannels = channels
+
+        for bitrate in plan.bitrates:
+            deliverable = (aformat, resolve_bitrate(aformat, bitrate, outchannels), outchannels, downmix_config)
+            if deliverable not in deliverables: deliverables.append(deliverable)
+
+    if skipped:
+        simplens.pb.console.print(f'[bold yellow]Skipped[/bold yellow] for {channel_number_to_name(channels)} inputs: {", ".join(skipped)}\
+{"" if deliverables else ", nothing to encode"}')
+    if plan.layouts:
+        simplens.pb.console.print(f'[bold color(231)]New input layout:[/bold color(231)] {channel_number_to_name(channels)}, \
+{samplerate} Hz, {bit_depth} bit -> {", ".join(f"{d[0].upper()} {channel_number_to_name(d[2])}" for d in deliverables)}')
+
+    plan.layouts[layout_key] = SimpleNamespace(
+        samplerate=samplerate,
+        channels=channels,
+        bit_depth=bit_depth,
+        deliverables=deliverables,
+        xml_bases=[build_xml_base(*deliverable, plan.output) for deliverable in deliverables],
+        bitrates_per_format={aformat: sum(d[0] == aformat for d in deliverables) for aformat in plan.formats},
+    )
+    return plan.layouts[layout_key]
+
+
+def plan_file(fl: str, sources: list[dict[str, Any]]) -> FilePlan:
+    config, plan = simplens.config, simplens.plan
+
+    delay_in_filename = re.match(r'.+DELAY ([-|+]?[0-9]+m?s)\..+', fl)
+    if delay_in_filename:
+        delay = delay_in_filename[1]
+        if not delay.startswith(('-', '+')):
+            delay = f'+{delay}'
+    else:
+        delay = '+0ms'
+    if args.delay:
+        delay = args.delay
+    # checked while planning, the XML only gets written by the encode workers
+    delay_print = convert_delay_to_ms(delay, compensate=False)[0]
+    segmentable = args.segments > 1 and not args.measure_only and delay_print == '0.000 ms'
+
+    intermediates = {}
+    jobs = []
+    costs = []
+    for source in sources:
+        trackindex, length = source['trackindex'], source['length']
+        layout = get_layout(source)
+        if length != -1: plan.known_lengths.append(length)
+        if length == -1 and plan.known_lengths: length = sum(plan.known_lengths) / len(plan.known_lengths)
+
+        for (aformat, bitrate, outchannels, downmix_config), xml_base in zip(layout.deliverables, layout.xml_bases):
+            resample_value = resample_target(aformat, layout.samplerate)
+            codec = intermediate_codec(layout.bit_depth, resample_value)
+            key = intermediate_key(fl, trackindex, codec, resample_value, layout.channels == 8)
+            wav_file = os.path.join(config['temp_path'], basename(fl, f'{key}.wav'))
+
+            extension = output_extension(aformat, bitrate)
+            if layout.bitrates_per_format[aformat] > 1: extension = f'{bitrate}.{extension}'
+            if len(sources) > 1: extension = f'track{trackindex}.{extension}'
+            out_name = basename(fl, extension, stripdelay=True)
+
+            loudness = cached_loudness(key, xml_base)
+            if loudness is not None and args.measure_only:
+                # the cached measurement is the result, nothing has to be decoded or run
+                measured_dn = str(add_measurement(fl, trackindex, loudness))
+                simplens.pb.add_task(f'[bold cyan]DEE[/bold cyan]: measure | {trim_names(out_name, 18 + len(measured_dn))} ({measured_dn} dB)', total=100, completed=100)
+                continue
+
+            if key not in intermediates:
+                output_args, output_args_print = build_ffmpeg_output(wav_file, codec, resample_value, layout.channels, trackindex, f'a{key}')
+
+                intermediate_exists = False
+                if os.path.exists(wav_file):
+                    if wav_is_complete(wav_file):
+                        intermediate_exists = True
+                        os.utime(wav_file)
+                    else:
+                        os.remove(wav_file)
+
+                # a PCM WAV in the right format only needs the 7.1 reorder, or nothing at all
+                dee_ready = source['container'] == 'wav' and source['codec'] == codec and not resample_value
+                borrowed = dee_ready and layout.channels != 8 and not intermediate_exists
+                if borrowed:
+                    link = link_input(fl, wav_file)
+                    if link: wav_file, intermediate_exists = link, True
+                    borrowed = link is not None
+                reorder = dee_ready and layout.channels == 8 and not intermediate_exists and simplens.has_numpy
+
+                intermediates[key] = Intermediate(fl, trackindex, key, wav_file, source['length'], output_args, output_args_print, intermediate_exists,
+                                                  borrowed=borrowed, reorder=reorder,
+                                                  size=intermediate_size(length, int(resample_value or layout.samplerate), layout.channels, codec))
+            intermediate = intermediates[key]
+            intermediate.consumers += 1
+
+            xml_name = basename(fl, f'{key}.{extension}.xml', sanitize=True)
+            dee_xml_input = f'{plan.dee_xml_input_base}{xml_name}'
+
+            dee_args = [
+                config['dee_path'],
+                '--progress-interval', '500',
+                '--diagnostics-interval', '90000',
+                '-x', dee_xml_input,
+                *(plan.xml_validation)
+            ]
+            dee_args_print = f'[bold cyan]dee[/bold cyan] -x [bold magenta]{dee_xml_input}[/bold magenta]{plan.xml_validation_print}'
+
+            segments = clamp(int(source['length'] // 60), 1, args.segments) if segmentable and aformat in ['dd', 'ddp'] else 1
+
+            jobs.append(Job(intermediate, aformat, plan.output, out_name, os.path.join(config['temp_path'], xml_name), dee_args, dee_args_print, xml_base, delay, segments,
+                            0 if loudness is None else clamp(round(loudness), -31, -1)))
+            costs.append(job_cost(max(length, 0), layout.channels, aformat))
+
+    if plan.stream:
+        for job in jobs:
+            # a pipe can only be read once, shared intermediates and two pass encodes need a file
+            intermediate = job.intermediate
+            intermediate.stream = not intermediate.exists and intermediate.consumers == 1 and not intermediate.reorder and not dee_reads_twice(job) and job.segments == 1
+            if intermediate.stream:
+                # ffmpeg can't seek back in a pipe to fill in the ds64 sizes, a plain WAV header marks the length as unknown instead
+                rf64 = intermediate.output_args.index('-rf64')
+                del intermediate.output_args[rf64:rf64 + 2]
+                intermediate.output_args_print = intermediate.output_args_print.replace('-rf64 [bold color(231)]always[/bold color(231)] ', '')
+
+    # one ffmpeg process per input writes all of its intermediates that still have to be decoded
+    dec = None
+    decode_intermediates = [i for i in intermediates.values() if not i.exists and not i.stream and not i.reorder]
+    if decode_intermediates:
+        ffmpeg_args, ffmpeg_args_print = build_ffmpeg_args(fl, decode_intermediates)
+        length = max(i.length for i in decode_intermediates)
+        dec = Decode(fl, -1 if length == -1 else length, decode_intermediates, ffmpeg_args, ffmpeg_args_print)
+
+    # borrowed inputs and pipes take no temp space, existing intermediates already do
+    temp_size = sum(i.size for i in intermediates.values() if not i.borrowed and not i.stream)
+    return FilePlan(fl, sum(costs), costs, list(intermediates.values()), jobs, dec, any(i.exists and not i.borrowed for i in intermediates.values()), temp_size)
+
+
+def temp_footprint(file_plans: list[FilePlan], instances: int, decode_instances: int) -> str:
+    total = sum(p.temp_size for p in file_plans)
+    if args.keeptemp or simplens.cache_budget: return f'{format_size(total)} (kept after encoding)'
+    # intermediates live from their decode until the last encode, a full handoff queue is the worst case
+    live = heapq.nlargest(decode_instances + 2 * instances, (p.temp_size for p in file_plans))
+    return f'{format_size(total)} in total, up to {format_size(sum(live))} at once'
+
+
+def print_file_plan(file_plan: FilePlan) -> None:
+    pb = simplens.pb
+    if file_plan.decode:
+        dee_prints = [job.dee_args_print for job in file_plan.jobs if job.intermediate in file_plan.decode.intermediates]
+        pb.console.print(f'{file_plan.decode.ffmpeg_args_print} && {" & ".join(dee_prints)}')
+    for intermediate in file_plan.intermediates:
+        dee_prints = [job.dee_args_print for job in file_plan.jobs if job.intermediate is intermediate]
+        if intermediate.stream:
+            pb.console.print(f'{build_ffmpeg_args(file_plan.fl, [intermediate])[1]} | {" & ".join(dee_prints)}')
+        elif intermediate.borrowed:
+            pb.console.print(f'[green]Input is used as is[/green] && {" & ".join(dee_prints)}')
+        elif intermediate.reorder:
+            pb.console.print(f'[bold cyan]reorder[/bold cyan] [bold green]{file_plan.fl}[/bold green] [bold magenta]{intermediate.wav_file}[/bold magenta] && {" & ".join(dee_prints)}')
+        elif intermediate.exists:
+            pb.console.print(f'[green]Intermediate already exists[/green] && {" & ".join(dee_prints)}')
+
+
+def file_audio_length(file_plan: FilePlan) -> float:
+    return sum({i.trackindex: max(i.length, 0) for i in file_plan.intermediates}.values())
+
+
+def job_done(job: Job) -> None:
+    remaining = simplens.plan.remaining_jobs[job.intermediate.fl]
+    with simplens.cache_lock:
+        remaining[0] -= 1
+        file_done = remaining[0] == 0
+    if file_done: simplens.pb.file_done(remaining[1])
+
+
+def dispatch(file_plan: FilePlan) -> None:
+    plan = simplens.plan
+    # the order option can only rank files that are planned but haven't been picked up by a decoder yet
+    priority = {'longest': -file_plan.cost, 'shortest': file_plan.cost, 'input': plan.file_rank[file_plan.fl]}[args.order]
+    simplens.dispatch.put((priority, len(plan.file_plans), file_plan))
+    plan.file_plans.append(file_plan)
+    # a file is done when all of its outputs are, segments count once
+    plan.remaining_jobs[file_plan.fl] = [len(file_plan.jobs), file_audio_length(file_plan)]
+    if not file_plan.jobs: simplens.pb.file_done(file_audio_length(file_plan))
+    emit('file_planned', file=file_plan.fl, jobs=len(file_plan.jobs), cost=round(file_plan.cost, 3), temp_size=file_plan.temp_size,
+         decode=bool(file_plan.decode), outputs=[os.path.join(job.output, job.out_name) for job in file_plan.jobs])
+    if args.long_argument: print_file_plan(file_plan)
+
+
+def write_measure_report(path: str, measurements: list[dict[str, Any]]) -> None:
+    measurements = sorted(measurements, key=lambda m: (m['file'], m['track']))
+    with open(path, 'w', encoding='utf-8', newline='') as fd:
+        if path.lower().endswith('.json'):
+            json.dump(measurements, fd, indent=2)
         else:
-            delay_print, delay_xml, delay_mode = convert_delay_to_ms(delay, compensate=False)
-            xml['job_config']['filter']['audio']['encode_to_dthd'][delay_mode] = delay_xml
+            writer = csv.DictWriter(fd, fieldnames=['file', 'track', 'loudness', 'dialnorm', 'error'])
+            writer.writeheader()
+            writer.writerows(measurements)
 
-        save_xml(os.path.join(config['temp_path'], basename(filelist[i], 'xml', sanitize=True)), xml)
 
-        settings.append([filelist[i], output, length_list[i], ffmpeg_args, dee_args, intermediate_exists, aformat])
+def add_measurement(fl: str, trackindex: int, loudness: float) -> int:
+    dialnorm = clamp(round(loudness), -31, 0) if math.isfinite(loudness) else -31
+    simplens.measurements.append({'file': fl, 'track': trackindex, 'loudness': round(loudness, 2) if math.isfinite(loudness) else None, 'dialnorm': dialnorm, 'error': None})
+    emit('measured', **simplens.measurements[-1])
+    return dialnorm
 
-    if args.long_argument:
-        print('[bold color(231)]Running the following commands:[/bold color(231)]')
-        for ff, d in zip(ffmpeg_print_list, dee_print_list):
-            print(f'{ff} && {d}')
+
+def add_measure_error(fl: str, trackindex: int | None, error: BaseException) -> None:
+    simplens.measurements.append({'file': fl, 'track': trackindex, 'loudness': None, 'dialnorm': None, 'error': str(error) or type(error).__name__})
+    emit('measure_failed', **simplens.measurements[-1])
+
+
+def measure_native(filelist: list[str], trackindexes: list[int] | None, workers: int) -> int:
+    try:
+        from deew.loudness import integrated_loudness
+    except ImportError:
+        print_exit('numpy')
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+    def probe_file(fl: str) -> list[dict[str, Any]] | PlanError:
+        try:
+            return probe(fl, trackindexes)
+        except PlanError as e:
+            return e
+
+    # one file that can't be probed or decoded doesn't end the audit, it gets a row with the error
+    failed = 0
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        probed = list(pool.map(probe_file, filelist))
+    sources = []
+    for fl, file_sources in zip(filelist, probed):
+        if isinstance(file_sources, PlanError):
+            failed += 1
+            add_measure_error(fl, None, file_sources)
+        else:
+            sources.extend((fl, source) for source in file_sources)
+    tracks_per_file = {fl: sum(f == fl for f, _ in sources) for fl in filelist}
+
+    # decoding and metering happen in separate processes, nothing gets written to the temp path
+    pb = make_progress()
+    with pb, ProcessPoolExecutor(max_workers=workers) as pool:
+        for fl in (m['file'] for m in simplens.measurements):
+            pb.add_task(f'[bold cyan]1770[/bold cyan]: measure | {trim_names(os.path.basename(fl), 22)} [red](failed)[/red]', total=100, completed=0)
+        futures = {pool.submit(integrated_loudness, simplens.config['ffmpeg_path'], fl, s['trackindex'], s['samplerate'], s['channels']): (fl, s['trackindex']) for fl, s in sources}
+        for future in as_completed(futures):
+            fl, trackindex = futures[future]
+            name = basename(fl, f'track{trackindex}' if tracks_per_file[fl] > 1 else os.path.splitext(fl)[1][1:])
+            try:
+                loudness = future.result()
+            except Exception as e:
+                failed += 1
+                add_measure_error(fl, trackindex, e)
+                pb.add_task(f'[bold cyan]1770[/bold cyan]: measure | {trim_names(name, 22)} [red](failed)[/red]', total=100, completed=0)
+                continue
+            dialnorm = str(add_measurement(fl, trackindex, loudness))
+            pb.add_task(f'[bold cyan]1770[/bold cyan]: measure | {trim_names(name, 19 + len(dialnorm))} ({dialnorm} dB)', total=100, completed=100)
+    return failed
+
+
+def locations() -> SimpleNamespace:
+    if getattr(sys, 'frozen', False):
+        script_path = os.path.dirname(sys.executable)
+        standalone = 1
     else:
-        if intermediate_exists_list:
-            print(f'[bold color(231)]Intermediate already exists for the following file(s):[/bold color(231)] \
-[bold magenta]{"[not bold white],[/not bold white] ".join(intermediate_exists_list)}[bold magenta]')
-        print(f'[bold color(231)]Running the following commands:[/bold color(231)]\n{ffmpeg_args_print_short} && {dee_args_print_short}')
+        script_path = os.path.dirname(__file__)
+        standalone = 0
 
-    print()
+    from platformdirs import PlatformDirs
+    dirs = PlatformDirs('deew', False)
+    return SimpleNamespace(
+        script_path=script_path,
+        standalone=standalone,
+        config_dir=dirs.user_config_dir,
+        config_paths=[os.path.join(dirs.user_config_dir, 'config.toml'), os.path.join(script_path, 'config.toml')],
+        cache_dir=dirs.user_cache_dir,
+    )
+
+
+def setup(loc: SimpleNamespace) -> None:
+    # the config, the binaries and the machine don't change between runs, a process that plans several of them does this once
+    import toml
+    try:
+        config = toml.load(loc.config_paths[0])
+    except Exception:
+        config = toml.load(loc.config_paths[1])
+    simplens.config = config
 
-    pb = Progress('[', '{task.description}', ']', BarColumn(), '[magenta]{task.percentage:>3.2f}%', refresh_per_second=8)
+    config_keys = [
+                    'ffmpeg_path',
+                    'ffprobe_path',
+                    'dee_path',
+                    'temp_path',
+                    'logo',
+                    'max_instances',
+                    'default_bitrates',
+                    'summary_sections'
+                ]
+    c_key_missing = []
+    for c_key in config_keys:
+        if c_key not in config: c_key_missing.append(c_key)
+    if len(c_key_missing) > 0: print_exit('config_key', f'[bold yellow]{"[not bold white], [/not bold white]".join(c_key_missing)}[/bold yellow]')
+
+    for i in config['dee_path'], config['ffmpeg_path'], config['ffprobe_path']:
+        if not shutil.which(i): print_exit('binary_exist', i)
+
+    simplens.dee_version, simplens.dee_is_exe = binary_info(config['dee_path'], [])
+    simplens.is_nonnative_exe = simplens.dee_is_exe and platform.system() != 'Windows'
+
+    from packaging import version
+    try:
+        simplens.dee_measure_pass = version.parse(simplens.dee_version.replace('-master', '')) >= version.parse('5.2.0')
+    except version.InvalidVersion:
+        simplens.dee_measure_pass = True
+    simplens.ffmpeg_version = binary_info(config['ffmpeg_path'], ['-version'])[0]
+    simplens.ffprobe_version = binary_info(config['ffprobe_path'], ['-version'])[0]
+
+    if not config['temp_path']:
+        if simplens.is_nonnative_exe:
+            config['temp_path'] = rwpc(ntpath.join(
+                subprocess.run(['powershell.exe', "(gi $env:TEMP).fullname"], capture_output=True, encoding='utf-8').stdout.strip(),
+                'deew',
+            ))
+        else:
+            config['temp_path'] = os.path.join(loc.script_path, 'temp') if loc.standalone else tempfile.gettempdir()
+            if config['temp_path'] == '/tmp':
+                config['temp_path'] = '/var/tmp/deew'
+    config['temp_path'] = os.path.abspath(config['temp_path'])
+    createdir(config['temp_path'])
+    simplens.cache_budget = int(float(config.get('intermediate_cache_size', 0)) * 1024 ** 3)
+    simplens.intermediate_depth = str(config.get('intermediate_depth', 'auto')).lower()
+    if simplens.intermediate_depth not in ['auto', '24', '32', 'float']: print_exit('intermediate_depth')
+
+    simplens.cgroups = cgroup_paths()
+    simplens.cpus = available_cpus()
+    simplens.decode_nice = clamp(int(config.get('decode_nice', 10)), 0, 19) if hasattr(os, 'setpriority') else 0
+    decode_ionice = config.get('decode_ionice', 'best-effort')
+    if decode_ionice not in ['best-effort', 'idle', '']: print_exit('decode_ionice')
+    simplens.decode_ionice = {'best-effort': ['-c', '2', '-n', '7'], 'idle': ['-c', '3'], '': []}[decode_ionice] if shutil.which('ionice') else []
+
+    # decodes are grouped by the drives they read from and write to
+    simplens.temp_dev = os.stat(config['temp_path']).st_dev
+    simplens.device_decode_instances = int(config.get('device_decode_instances', 0))
+    simplens.device_limits = {}
+    for path, limit in config.get('device_decode_limits', {}).items():
+        if not os.path.exists(path): print_exit('path', path)
+        simplens.device_limits[os.stat(path).st_dev] = int(limit)
+    simplens.configured = True
+
+
+def start_plan(inputs: list[str]) -> list[str]:
+    # everything that depends on the options of a single run, returns the input files
+    config, cpu__count = simplens.config, simplens.cpus
+
+    # decodes are admitted into the first tier their intermediates fit in, the temp path is the last one
+    simplens.temp_releasable = not args.keeptemp and not simplens.cache_budget
+    simplens.temp_tiers = [TempTier(config['temp_path'], int(float(config.get('temp_reserve', 1)) * 1024 ** 3))]
+    ram_temp_size = int(float(config.get('ram_temp_size', 0)) * 1024 ** 3)
+    if config.get('ram_temp_path') and ram_temp_size and simplens.temp_releasable and not simplens.is_nonnative_exe:
+        ram_temp_path = os.path.abspath(config['ram_temp_path'])
+        createdir(ram_temp_path)
+        simplens.temp_tiers.insert(0, TempTier(ram_temp_path, 0, ram_temp_size))
+    simplens.temp_cond = threading.Condition()
+
+    if args.instances:
+        instances = args.instances
+    else:
+        instances = config['max_instances']
+    if isinstance(instances, str) and instances.endswith('%'):
+        instances = cpu__count * (int(instances.replace('%', '')) / 100)
+    else:
+        instances = int(instances)
+    if simplens.dee_is_exe:
+        instances = clamp(instances, 1, cpu__count - 2)
+        instances = clamp(instances, 1, 6)
+    else:
+        instances = clamp(instances, 1, cpu__count)
+    if memory_limit(): instances = min(instances, memory_limit() // dee_instance_memory)
+    if instances == 0: instances = 1
+    adaptive = bool(config.get('adaptive_instances', False)) and hasattr(os, 'getloadavg')
+
+    # every encode worker gets its own pair of threads, pairs are shared when there are more workers than pairs
+    pairs = [None]
+    if config.get('pin_instances', False) and hasattr(os, 'sched_setaffinity') and not simplens.dee_is_exe:
+        pairs = cpu_pairs(list(os.sched_getaffinity(0)))
+    simplens.instance_limit = int(instances)
+    simplens.running_instances = 0
+    simplens.instance_cond = threading.Condition()
+
+    decode_instances = args.decode_instances if args.decode_instances else config.get('decode_instances', 2)
+    if isinstance(decode_instances, str) and decode_instances.endswith('%'):
+        decode_instances = cpu__count * (int(decode_instances.replace('%', '')) / 100)
+    decode_instances = clamp(int(decode_instances), 1, cpu__count)
+    simplens.device_busy = {}
+    simplens.device_lock = threading.Lock()
+
+    formats = list(dict.fromkeys(f.lower() for f in parse_list(args.format)))
+    try:
+        bitrates = [int(b) for b in parse_list(args.bitrate)] if args.bitrate else [None]
+    except ValueError:
+        print_exit('bitrate')
+    downmix = args.downmix
+    args.dialnorm = clamp(args.dialnorm, -31, 0)
+    if args.track_index.lower() == 'all':
+        trackindexes = None
+    else:
+        try:
+            trackindexes = list(dict.fromkeys(max(0, int(t)) for t in parse_list(args.track_index)))
+        except ValueError:
+            print_exit('track_index')
+
+    if not formats or any(aformat not in ['dd', 'ddp', 'thd', 'ac4'] for aformat in formats): print_exit('format')
+    if downmix and downmix not in [1, 2, 6]: print_exit('downmix')
+    if downmix and 'thd' in formats: print_exit('thd_downmix')
+    if args.drc not in ['film_light', 'film_standard', 'music_light', 'music_standard', 'speech', 'none']: print_exit('drc')
+    if not simplens.dee_is_exe and platform.system() == 'Linux' and 'thd' in formats: print_exit('linux_thd')
+    if args.measure_only: formats, bitrates = ['ddp'], [None]
+    if args.order not in ['longest', 'shortest', 'input']: print_exit('order')
+    if args.measure_engine not in ['dee', 'native']: print_exit('measure_engine')
+
+    filelist = []
+    for f in inputs:
+        if not os.path.exists(f): print_exit('path', f)
+        if os.path.isdir(f):
+            filelist.extend(glob(f + os.path.sep + '*'))
+        else:
+            filelist.append(f)
+    filelist = list(dict.fromkeys(filelist))
+
+    if args.output:
+        createdir(os.path.abspath(args.output))
+        output = os.path.abspath(args.output)
+    else:
+        output = os.getcwd()
+
+    if simplens.is_nonnative_exe:
+        dee_xml_input_base = wpc(config['temp_path'])
+    else:
+        dee_xml_input_base = config['temp_path'] if config['temp_path'].endswith('/') else f'{config["temp_path"]}/'
+
+    stream = args.stream
+    if stream and (simplens.is_nonnative_exe or not hasattr(os, 'mkfifo')):
+        print('[bold yellow]Streaming[/bold yellow] needs named pipes and a native DEE, falling back to temp files.')
+        stream = False
+
+    simplens.measurements = []
+    simplens.dee_logs = []
+    simplens.results = []
+    simplens.plan = SimpleNamespace(
+        formats=formats,
+        bitrates=bitrates,
+        downmix=downmix,
+        trackindexes=trackindexes,
+        output=output,
+        dee_xml_input_base=dee_xml_input_base,
+        xml_validation=[] if simplens.dee_is_exe else ['--disable-xml-validation'],
+        xml_validation_print='' if simplens.dee_is_exe else ' --disable-xml-validation',
+        stream=stream,
+        instances=instances,
+        decode_instances=decode_instances,
+        adaptive=adaptive,
+        pairs=pairs,
+        layouts={},
+        known_lengths=[],
+        file_rank={fl: n for n, fl in enumerate(filelist)},
+        file_plans=[],
+        pending=[],
+        remaining_jobs={},
+        predicted=None,
+        seconds=None,
+    )
+    return filelist
+
+
+def execute(file_plans: Iterable[FilePlan]) -> list[BaseException]:
+    # ffmpeg and DEE run in separate pools, the next files get decoded while the current ones are encoding
+    plan, started = simplens.plan, time.monotonic()
+    instances = int(plan.instances)
+    simplens.handoff = queue.Queue(maxsize=instances)
+    simplens.dispatch = queue.PriorityQueue()
+    # files waiting for a busy drive, they go back into dispatch when a decode on it finishes
+    simplens.parked = {}
+    errors = []
+    encoders = [threading.Thread(target=encode_worker, args=(errors, plan.pairs[n % len(plan.pairs)]), daemon=True) for n in range(instances)]
+    controller_stop = threading.Event()
+    if plan.adaptive: threading.Thread(target=instance_controller, args=(instances, controller_stop), daemon=True).start()
+    decoders = [threading.Thread(target=decode_worker, args=(errors,), daemon=True) for _ in range(plan.decode_instances)]
+    for worker in encoders + decoders: worker.start()
+    emit('run_started', files=len(plan.file_rank), formats=plan.formats, instances=instances, decode_instances=plan.decode_instances, temp_path=simplens.config['temp_path'])
+
+    for file_plan in file_plans: dispatch(file_plan)
+
+    for n, decoder in enumerate(decoders): simplens.dispatch.put((math.inf, n, None))
+    for decoder in decoders: decoder.join()
+    for encoder in encoders: simplens.handoff.put(None)
+    for encoder in encoders: encoder.join()
+    controller_stop.set()
+    plan.seconds = time.monotonic() - started
+    if not errors and plan.predicted is not None:
+        # what the planned work took, for the predictions of later runs
+        store_dee_rate(plan.file_plans, instances, simplens.dee_logs, plan.seconds)
+    emit('run_finished', jobs=len(simplens.dee_logs), failed=len(errors), seconds=round(plan.seconds, 3),
+         predicted=None if plan.predicted is None else round(plan.predicted, 3))
+    return errors
+
+
+def options_namespace(options: dict[str, Any]) -> argparse.Namespace:
+    # the options are the long CLI flags, unset ones keep the CLI defaults
+    parser = build_parser()
+    namespace = parser.parse_args([])
+    actions = {action.dest: action for action in parser._actions}
+    for key, value in options.items():
+        key = key.lstrip('-').replace('-', '_')
+        if not hasattr(namespace, key): raise ValueError(f'unknown option: {key}')
+        if isinstance(value, (list, tuple)): value = ','.join(str(v) for v in value)
+        # values get the same conversion as on the command line, so bitrate=640 becomes '640' and downmix='2' becomes 2
+        if value is not None and actions[key].nargs != 0:
+            try: value = (actions[key].type or str)(value)
+            except ValueError: raise ValueError(f'invalid value for {key}: {value!r}') from None
+        setattr(namespace, key, value)
+    namespace.no_prompt = True
+    return namespace
+
+
+def trim_plan(file_plan: FilePlan, selected: set[int]) -> FilePlan:
+    # jobs that were planned but not passed to run() give up their share of the intermediates
+    jobs, costs = [], []
+    for job, cost in zip(file_plan.jobs, file_plan.costs):
+        if id(job) in selected:
+            jobs.append(job)
+            costs.append(cost)
+        else:
+            job.intermediate.consumers -= 1
+    intermediates = [i for i in file_plan.intermediates if i.consumers]
+    for intermediate in file_plan.intermediates:
+        if not intermediate.consumers and intermediate.borrowed and intermediate.wav_file != os.path.abspath(file_plan.fl) and os.path.lexists(intermediate.wav_file):
+            os.remove(intermediate.wav_file)
+
+    dec = file_plan.decode
+    if dec and len(intermediates) < len(file_plan.intermediates):
+        decode_intermediates = [i for i in dec.intermediates if i.consumers]
+        dec = replace(dec, intermediates=decode_intermediates, ffmpeg_args=build_ffmpeg_args(dec.fl, decode_intermediates)[0]) if decode_intermediates else None
+    temp_size = sum(i.size for i in intermediates if not i.borrowed and not i.stream)
+    return replace(file_plan, cost=sum(costs), costs=costs, intermediates=intermediates, jobs=jobs, decode=dec, temp_size=temp_size)
+
+
+def drop_pending() -> None:
+    # a plan that never gets run still has its input links in the temp path
+    plan = getattr(simplens, 'plan', None)
+    if not plan: return
+    for file_plan in plan.pending: trim_plan(file_plan, set())
+    plan.pending = []
+
+
+def plan(inputs: list[str], options: dict[str, Any] | None = None) -> list[Job]:
+    # the inputs get probed and planned like on the command line, nothing is decoded or encoded until run()
+    global args
+    with api_lock:
+        simplens.api = True
+        drop_pending()
+        args = options_namespace(options or {})
+        if not simplens.configured:
+            loc = locations()
+            if not any(os.path.exists(p) for p in loc.config_paths): raise PlanError('config_missing', loc.config_paths[0])
+            simplens.cache = open_cache(loc.cache_dir)
+            simplens.has_numpy = importlib.util.find_spec('numpy') is not None
+            setup(loc)
+            atexit.register(drop_pending)
+        filelist = start_plan(list(inputs))
+        if args.measure_only and args.measure_engine == 'native': raise PlanError('api_native')
+        simplens.pb = NullProgress()
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            probed = list(pool.map(lambda fl: probe(fl, simplens.plan.trackindexes), filelist))
+        # files planned before one that fails are pending too, so their links get dropped with the next plan
+        for fl, sources in zip(filelist, probed): simplens.plan.pending.append(plan_file(fl, sources))
+        return [job for file_plan in simplens.plan.pending for job in file_plan.jobs]
+
+
+def run(jobs: list[Job], callbacks: dict[str, Callable[..., Any]] | None = None) -> list[JobResult]:
+    # callbacks are called with the fields of the --progress json events they are named after, job_result gets every result
+    with api_lock:
+        # the jobs carry no settings of their own, the binaries, options and temp path all come from the plan() that made them
+        last_plan = getattr(simplens, 'plan', None) if simplens.api else None
+        selected = {id(job) for job in jobs}
+        if not last_plan or not selected <= {id(job) for file_plan in last_plan.pending for job in file_plan.jobs}: raise PlanError('api_run')
+        file_plans = [file_plan for file_plan in (trim_plan(p, selected) for p in last_plan.pending) if file_plan.jobs]
+        last_plan.pending = []
+
+        simplens.callbacks = callbacks or {}
+        predict_run(file_plans, int(simplens.plan.instances))
+        try:
+            with simplens.pb: execute(file_plans)
+        finally:
+            simplens.callbacks = {}
+        if simplens.cache_budget and not args.keeptemp: evict_intermediates(simplens.config['temp_path'], simplens.cache_budget)
+        if args.measure_only and args.measure_report: write_measure_report(args.measure_report, simplens.measurements)
+        return simplens.results
+
+
+def main() -> None:
+    global args
+    # the native measure engine runs in a process pool, frozen builds would start main again in every worker
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    parser = build_parser()
+    if len(sys.argv) == 1:
+        parser.print_help(sys.stderr)
+        sys.exit(1)
+    args = parser.parse_args()
+
+    if args.changelog: print_changelog()
+    if args.list_bitrates: list_bitrates()
+    if args.print_logos: print_logos()
+
+    if args.progress not in ['bar', 'json']: print_exit('progress')
+    if args.progress == 'json' or args.progress_socket:
+        simplens.events = open_events(args.progress_socket)
+        # stdout only carries events from here on, everything else goes to stderr
+        if simplens.events is sys.stdout: sys.stdout = sys.stderr
+        args.no_prompt = True
+
+    loc = locations()
+    config_path1, config_path2 = loc.config_paths
+
+    if args.config:
+        if loc.standalone:
+            print(f'[bold cyan]Your config locations:[/bold cyan]\n{config_path1}\n{config_path2}\n\n[bold cyan]Your current config:[/bold cyan]')
+            if os.path.exists(config_path1):
+                current_conf = config_path1
+            elif os.path.exists(config_path2):
+                current_conf = config_path2
+            else:
+                print('You don\'t have a config currently.')
+                sys.exit(0)
+        else:
+            print(f'[bold cyan]Your config location:[/bold cyan]\n{config_path1}\n\n[bold cyan]Your current config:[/bold cyan]')
+            if os.path.exists(config_path1):
+                current_conf = config_path1
+            else:
+                print('You don\'t have a config currently.')
+                sys.exit(0)
+        from rich.console import Console
+        from rich.syntax import Syntax
+        with open(current_conf, 'r') as conf:
+            Console().print(Syntax(conf.read(), 'toml'))
+        sys.exit(0)
+
+    if args.generate_config:
+        generate_config(loc.standalone, config_path1, config_path2, loc.config_dir)
+        sys.exit(0)
+
+    simplens.cache = open_cache(loc.cache_dir)
+    simplens.has_numpy = importlib.util.find_spec('numpy') is not None
+    if args.prune_cache: prune_cache(simplens.cache)
+
+    if not os.path.exists(config_path1) and not os.path.exists(config_path2):
+        print(f'[bold yellow]config.toml[/bold yellow] [not bold white]is missing, creating one...[/not bold white]')
+        generate_config(loc.standalone, config_path1, config_path2, loc.config_dir)
+
+    setup(loc)
+    config = simplens.config
+    if 0 < config['logo'] < len(logos) + 1 and not simplens.events: print(logos[config['logo'] - 1])
+
+    simplens.latest_version = None
+    simplens.update_check = None
+    if config['summary_sections'].get('deew_info') and not simplens.events:
+        simplens.update_check = threading.Thread(target=check_latest_version,
+                                                 args=(config.get('update_check_ttl', 24) * 3600, config.get('update_check_timeout', 2)),
+                                                 daemon=True)
+        simplens.update_check.start()
+
+    filelist = start_plan(args.input)
+    # the planner waits for the first probed input, an empty folder would never deliver one
+    if not filelist: print_exit('no_input')
+    instances, decode_instances = simplens.plan.instances, simplens.plan.decode_instances
+
+    if args.measure_only and args.measure_engine == 'native':
+        failed = measure_native(filelist, simplens.plan.trackindexes, int(instances))
+        if args.measure_report: write_measure_report(args.measure_report, simplens.measurements)
+        sys.exit(1 if failed else 0)
+
+    # files are probed in the background, the first encode starts as soon as its own probe is done
+    simplens.unprobed = queue.Queue()
+    simplens.probed = queue.Queue()
+    simplens.probe_stop = threading.Event()
+    for fl in filelist: simplens.unprobed.put(fl)
+    for _ in range(clamp(len(filelist), 1, 8)):
+        threading.Thread(target=probe_worker, args=(simplens.plan.trackindexes,), daemon=True).start()
+    first_fl, first_sources = simplens.probed.get()
+    if isinstance(first_sources, PlanError): print_exit(*first_sources.args)
+    if isinstance(first_sources, Exception): raise first_sources
+
+    # a few finished rows stay on screen next to the running ones
+    pb = make_progress(max(10, 2 * (int(instances) + decode_instances)), len(filelist))
     simplens.pb = pb
 
+    # the prompts and the summary describe the first probed input, other layouts get planned as they come in
+    try:
+        first_layout = get_layout(first_sources[0])
+    except PlanError as e:
+        print_exit(*e.args)
+    channels, bit_depth, deliverables = first_layout.channels, first_layout.bit_depth, first_layout.deliverables
+
+    from rich.prompt import Confirm
+    if any(d[2] in [1, 2] and d[0] in ['dd', 'ddp'] for d in deliverables) and not args.measure_only:
+        if args.no_prompt:
+            print('Consider using [bold cyan]qaac[/bold cyan] or [bold cyan]opus[/bold cyan] for \
+[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding.')
+        else:
+            continue_enc = Confirm.ask('Consider using [bold cyan]qaac[/bold cyan] or [bold cyan]opus[/bold cyan] for \
+[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding, are you sure you want to use [bold cyan]DEE[/bold cyan]?')
+            if not continue_enc: sys.exit(1)
+
+    if any(d[2] == 2 and d[0] == 'thd' for d in deliverables):
+        if args.no_prompt:
+            print('Consider using [bold cyan]FLAC[/bold cyan] for lossless \
+[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding.')
+        else:
+            continue_enc = Confirm.ask('Consider using [bold cyan]FLAC[/bold cyan] for lossless \
+[bold yellow]mono[/bold yellow] and [bold yellow]stereo[/bold yellow] encoding, are you sure you want to use [bold cyan]DEE[/bold cyan]?')
+            if not continue_enc: sys.exit(1)
+
+    if args.dialnorm != 0:
+        if args.no_prompt:
+            print('Consider leaving the dialnorm value at 0 (auto), setting it manually can be dangerous.')
+        else:
+            continue_enc = Confirm.ask('Consider leaving the dialnorm value at 0 (auto), setting it manually can be dangerous, are you sure you want to do it?')
+            if not continue_enc: sys.exit(1)
+
+    if not all(x is False for x in config["summary_sections"].values()) and not simplens.events:
+        from rich.table import Table
+        summary = Table(title='Encoding summary', title_style='not italic bold magenta', show_header=False)
+        summary.add_column(style='green')
+        summary.add_column(style='color(231)')
+
+        if config['summary_sections']['deew_info']:
+            from packaging import version
+
+            # the lookup has had the whole planning to finish, it only gets waited for up to its timeout
+            simplens.update_check.join(config.get('update_check_timeout', 2))
+            latest_version = simplens.latest_version
+            try:
+                if version.parse(prog_version) < version.parse(latest_version):
+                    latest_version = f'[bold green]{latest_version}[/bold green] !!!'
+            except Exception:
+                latest_version = "[red]couldn't fetch"
+            summary.add_row('[bold cyan]Version', prog_version)
+            summary.add_row('[bold cyan]Latest', latest_version, end_section=True)
+
+        if config['summary_sections']['binaries']:
+            summary.add_row('[cyan]DEE version', simplens.dee_version)
+            summary.add_row('[cyan]ffmpeg version', simplens.ffmpeg_version)
+            summary.add_row('[cyan]ffprobe version', simplens.ffprobe_version, end_section=True)
+
+        if config['summary_sections']['input_info']:
+            summary.add_row('[bold yellow]Input')
+            summary.add_row('Channels', channel_number_to_name(channels))
+            summary.add_row('Bit depth', str(bit_depth), end_section=True)
+
+        if not args.measure_only:
+            if config['summary_sections']['output_info']:
+                summary.add_row('[bold yellow]Output')
+                summary.add_row('Format', ', '.join('TrueHD' if d[0] == 'thd' else d[0].upper() for d in deliverables))
+                summary.add_row('Channels', ', '.join('immersive stereo' if d[0] == 'ac4' else channel_number_to_name(d[2]) for d in deliverables))
+                summary.add_row('Bitrate', ', '.join('N/A' if d[0] == 'thd' else f'{str(d[1])} kbps' for d in deliverables))
+                summary.add_row('Dialnorm', 'auto (0)' if args.dialnorm == 0 else f'{str(args.dialnorm)} dB', end_section=True)
+
+        if config['summary_sections']['other']:
+            if args.delay:
+                delay_print, delay_xml, delay_mode = convert_delay_to_ms(args.delay, compensate=False)
+            summary.add_row('[bold yellow]Other')
+            summary.add_row('Files', str(len(filelist)))
+            summary.add_row('Max instances', f'{instances:g} (adaptive)' if simplens.plan.adaptive else str(f'{instances:g}'))
+            summary.add_row('Decode instances', str(decode_instances))
+            if simplens.device_decode_instances or simplens.device_limits:
+                summary.add_row('Decodes per drive', str(simplens.device_decode_instances or 'no limit') + (' (or set per drive)' if simplens.device_limits else ''))
+            summary.add_row('Order', f'{args.order} first' if args.order != 'input' else 'input')
+            if args.segments > 1: summary.add_row('Segments', f'up to {args.segments} per DD/DDP encode')
+            summary.add_row('Delay', delay_print if args.delay else '0 ms or parsed from filename')
+            summary.add_row('Temp path', config['temp_path'])
+            if len(simplens.temp_tiers) > 1: summary.add_row('RAM temp path', f'{simplens.temp_tiers[0].path} (up to {format_size(simplens.temp_tiers[0].budget)})')
+            # what one hour of the first input takes up in the temp path, per intermediate format
+            rates = {}
+            for d in deliverables:
+                resample_value = resample_target(d[0], first_layout.samplerate)
+                codec = intermediate_codec(bit_depth, resample_value)
+                rates[codec] = intermediate_size(3600, int(resample_value or first_layout.samplerate), channels, codec)
+            summary.add_row('Intermediate', ', '.join(f'{codec[4:-2]} ({format_size(size)}/h)' for codec, size in rates.items()))
+
+        print(summary)
+        print()
+
+    try:
+        first_plan = plan_file(first_fl, first_sources)
+    except PlanError as e:
+        print_exit(*e.args)
+
+    if args.long_argument and not simplens.events:
+        print('[bold color(231)]Running the following commands:[/bold color(231)]')
+    elif first_plan.intermediates and not simplens.events:
+        # planned from the first probed input, there is nothing to run for inputs with a cached measurement
+        print('[bold color(231)]Running the following commands:[/bold color(231)]')
+        ffmpeg_args_print_short = f'[bold cyan]ffmpeg[/bold cyan] \
+-y \
+-drc_scale [bold color(231)]0[/bold color(231)] \
+-i [bold green]\[input][/bold green] \
+{first_plan.intermediates[0].output_args_print}\
+[bold magenta]\[output][/bold magenta]'
+        dee_args_print_short = f'[bold cyan]dee[/bold cyan] -x [bold magenta]\[input][/bold magenta]{simplens.plan.xml_validation_print}'
+        if first_plan.intermediates[0].borrowed:
+            print(dee_args_print_short)
+        elif first_plan.intermediates[0].reorder:
+            print(f'[bold cyan]reorder[/bold cyan] [bold green]\[input][/bold green] [bold magenta]\[output][/bold magenta] && {dee_args_print_short}')
+        else:
+            print(f'{ffmpeg_args_print_short} && {dee_args_print_short}')
+        print()
+
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
-    jobs = []
+    # files get dispatched while the rest of them are still being probed
+    plan_error = None
+
+    def planned_files() -> Iterator[FilePlan]:
+        nonlocal plan_error
+        yield first_plan
+        for _ in range(len(filelist) - 1):
+            fl, sources = simplens.probed.get()
+            try:
+                if isinstance(sources, Exception): raise sources
+                file_plan = plan_file(fl, sources)
+            except Exception as e:
+                # files that are already dispatched still get encoded, nothing new gets started
+                plan_error = e
+                simplens.probe_stop.set()
+                return
+            yield file_plan
+
+        file_plans = simplens.plan.file_plans
+        exists_list = [os.path.basename(p.fl) for p in file_plans if p.exists]
+        if exists_list and not args.long_argument:
+            pb.console.print(f'[bold color(231)]Intermediate already exists for the following file(s):[/bold color(231)] \
+[bold magenta]{"[not bold white],[/not bold white] ".join(exists_list)}[bold magenta]')
+        if simplens.plan.stream and any(not i.stream and not i.exists for p in file_plans for i in p.intermediates):
+            pb.console.print('[bold yellow]Streaming[/bold yellow] is not possible where DEE has to read the input twice \
+or the intermediate is shared by several outputs, falling back to temp files for those.')
+        if args.order != 'input': file_plans = sorted(file_plans, key=lambda p: p.cost, reverse=args.order == 'longest')
+        makespan = predict_run(file_plans, int(instances))
+        planned = f'Planned {sum(len(p.jobs) for p in file_plans)} jobs'
+        if makespan is None:
+            pb.console.print(f'[bold color(231)]{planned}[/bold color(231)]')
+        else:
+            pb.console.print(f'[bold color(231)]{planned}, predicted time:[/bold color(231)] {timedelta(seconds=round(makespan))}')
+        pb.console.print(f'[bold color(231)]Expected temp footprint:[/bold color(231)] {temp_footprint(file_plans, int(instances), decode_instances)}')
+        emit('planned', files=len(file_plans), jobs=sum(len(p.jobs) for p in file_plans), makespan=None if makespan is None else round(makespan, 3), temp_size=sum(p.temp_size for p in file_plans))
+
     with pb:
-        with ThreadPoolExecutor(max_workers=instances) as pool:
-            for setting in settings:
-                task_id = pb.add_task('', visible=False, total=None)
-                jobs.append(pool.submit(encode, task_id, setting))
-    for job in jobs:
-        job.result()
+        errors = execute(planned_files())
+    if isinstance(plan_error, PlanError): print_exit(*plan_error.args)
+    if plan_error: raise plan_error
+    if errors and isinstance(errors[0], PlanError): print_exit(*errors[0].args)
+    if errors: raise errors[0]
+
+    if simplens.cache_budget and not args.keeptemp: evict_intermediates(config['temp_path'], simplens.cache_budget)
+    if args.measure_only and args.measure_report: write_measure_report(args.measure_report, simplens.measurements)
+    if simplens.plan.predicted is not None and not simplens.events:
+        print(f'[bold color(231)]Finished in:[/bold color(231)] {timedelta(seconds=round(simplens.plan.seconds))} \
+(predicted {timedelta(seconds=round(simplens.plan.predicted))})')
+    if args.long_argument and simplens.dee_logs:
+        phases = ['startup', 'measure', 'encode', 'finalise']
+        totals = {phase: sum(log.get(phase, 0) for log in simplens.dee_logs) for phase in phases}
+        print(f'[bold color(231)]DEE time by phase:[/bold color(231)] {", ".join(f"{phase} {timedelta(seconds=round(totals[phase]))}" for phase in phases if totals[phase])}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+import subprocess
+
+import numpy as np
+
+# the K-weighting biquads are recursive, they get applied as a truncated impulse response with FFT overlap-add
+fir_length = 1 << 14
+chunk_length = 1 << 16
+
+
+def k_weighting(samplerate: int) -> np.ndarray:
+    # ITU-R BS.1770 pre-filter and RLB high-pass, derived for any sample rate
+    k = math.tan(math.pi * 1681.974450955533 / samplerate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    k = math.tan(math.pi * 38.13547087602444 / samplerate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = ([1, -2, 1], [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    response = np.zeros(fir_length)
+    response[0] = 1
+    for b, a in shelf, highpass:
+        filtered = np.zeros(fir_length)
+        x1 = x2 = y1 = y2 = 0.0
+        for n, x0 in enumerate(response):
+            y0 = b[0] * x0 + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+            filtered[n] = y0
+            x1, x2, y1, y2 = x0, x1, y0, y1
+        response = filtered
+    return response
+
+
+def channel_weights(channels: int) -> np.ndarray:
+    # LFE is left out, surrounds are boosted by 1.5 dB
+    weights = np.ones(channels)
+    if channels >= 6:
+        weights[3] = 0
+        weights[4:] = 1.41
+    return weights
+
+
+def gated_loudness(powers: np.ndarray, weights: np.ndarray) -> float:
+    # 400 ms blocks with 75% overlap, built from the 100 ms mean squares
+    if len(powers) < 4: return -math.inf
+    blocks = (powers[:-3] + powers[1:-2] + powers[2:-1] + powers[3:]) / 4 @ weights
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    blocks = blocks[loudness > -70]
+    if not len(blocks): return -math.inf
+    relative_gate = -0.691 + 10 * math.log10(blocks.mean()) - 10
+    with np.errstate(divide='ignore'):
+        blocks = blocks[-0.691 + 10 * np.log10(blocks) > relative_gate]
+    return -0.691 + 10 * math.log10(blocks.mean())
+
+
+def integrated_loudness(ffmpeg_path: str, fl: str, trackindex: int, samplerate: int, channels: int) -> float:
+    # like the intermediates, AC-3 and E-AC-3 sources are measured without their DRC
+    ffmpeg_args = [ffmpeg_path, '-v', 'error', '-nostdin', '-drc_scale', '0', '-i', fl, '-map', f'0:a:{trackindex}', '-c', 'pcm_f32le', '-f', 'f32le', '-']
+    ffmpeg = subprocess.Popen(ffmpeg_args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    nfft = 1 << math.ceil(math.log2(chunk_length + fir_length - 1))
+    response = np.fft.rfft(k_weighting(samplerate), nfft)[:, None]
+    tail = np.zeros((fir_length - 1, channels))
+    pending = np.zeros((0, channels))
+    step = round(samplerate / 10)
+    powers = []
+
+    frame_size = 4 * channels
+    with ffmpeg.stdout:
+        while True:
+            data = ffmpeg.stdout.read(chunk_length * frame_size)
+            if not data: break
+            data = data[:len(data) - len(data) % frame_size]
+            chunk = np.frombuffer(data, dtype='<f4').reshape(-1, channels).astype(np.float64)
+            filtered = np.fft.irfft(np.fft.rfft(chunk, nfft, axis=0) * response, nfft, axis=0)
+            filtered[:fir_length - 1] += tail
+            tail = filtered[len(chunk):len(chunk) + fir_length - 1]
+            pending = np.concatenate([pending, filtered[:len(chunk)]])
+
+            usable = len(pending) - len(pending) % step
+            powers.append(np.mean(np.square(pending[:usable]).reshape(-1, step, channels), axis=1))
+            pending = pending[usable:]
+    if ffmpeg.wait() != 0: raise RuntimeError(f'ffmpeg couldn\'t decode {fl}')
+
+    return gated_loudness(np.concatenate(powers) if powers else np.zeros((0, channels)), channel_weights(channels))
@@ -3,20 +3,29 @@ error_messages = {
     'delay'             : 'unsupported delay value.',
     'wsl_path'          : 'WSL path conversion doesn\'t work with [bold yellow]🤠[/bold yellow].',
     'create_dir'        : 'failed to create [bold yellow]🤠[/bold yellow].',
-    'format'            : '[bold yellow]-f[/bold yellow]/[bold yellow]--format[/bold yellow] can only be [bold yellow]dd[/bold yellow], [bold yellow]ddp[/bold yellow], [bold yellow]ac4[/bold yellow] or [bold yellow]thd[/bold yellow].',
+    'format'            : '[bold yellow]-f[/bold yellow]/[bold yellow]--format[/bold yellow] can only be [bold yellow]dd[/bold yellow], [bold yellow]ddp[/bold yellow], [bold yellow]ac4[/bold yellow] or [bold yellow]thd[/bold yellow] (or a comma separated list of them).',
+    'bitrate'           : '[bold yellow]-b[/bold yellow]/[bold yellow]--bitrate[/bold yellow] has to be a number or a comma separated list of numbers.',
     'downmix'           : '[bold yellow]-dm[/bold yellow]/[bold yellow]--downmix[/bold yellow] can only be [bold yellow]1[/bold yellow], [bold yellow]2[/bold yellow] or [bold yellow]6[/bold yellow].',
-    'downmix_mismatch'  : 'downmix value has to be lower than the number of input channels.',
     'thd_downmix'       : '[bold yellow]-m[/bold yellow]/[bold yellow]--mix[/bold yellow] can only be used for [bold yellow]DD[/bold yellow]/[bold yellow]DDP[/bold yellow] encoding.',
-    'thd_mono_input'    : 'input channels for TrueHD encoding can only be [bold yellow]2[/bold yellow]/[bold yellow]6[/bold yellow]/[bold yellow]8[/bold yellow]. ',
+    'measure_engine'    : '[bold yellow]-me[/bold yellow]/[bold yellow]--measure-engine[/bold yellow] can only be [bold yellow]dee[/bold yellow] or [bold yellow]native[/bold yellow].',
+    'numpy'             : 'the [bold yellow]native[/bold yellow] measure engine needs [bold yellow]numpy[/bold yellow], install it with [bold yellow]pip install numpy[/bold yellow].',
+    'intermediate_depth': '[bold yellow]intermediate_depth[/bold yellow] can only be [bold yellow]auto[/bold yellow], [bold yellow]24[/bold yellow], [bold yellow]32[/bold yellow] or [bold yellow]float[/bold yellow] in your config file.',
+    'temp_space'        : 'not enough free space in the temp path, [bold yellow]🤠[/bold yellow] is needed above [bold yellow]temp_reserve[/bold yellow].',
+    'decode_ionice'     : '[bold yellow]decode_ionice[/bold yellow] can only be [bold yellow]best-effort[/bold yellow], [bold yellow]idle[/bold yellow] or empty in your config file.',
+    'progress'          : '[bold yellow]-pr[/bold yellow]/[bold yellow]--progress[/bold yellow] can only be [bold yellow]bar[/bold yellow] or [bold yellow]json[/bold yellow].',
+    'progress_socket'   : 'couldn\'t connect to [bold yellow]🤠[/bold yellow].',
+    'order'             : '[bold yellow]-or[/bold yellow]/[bold yellow]--order[/bold yellow] can only be [bold yellow]longest[/bold yellow], [bold yellow]shortest[/bold yellow] or [bold yellow]input[/bold yellow].',
     'drc'               : 'allowed DRC values: [bold yellow]film_light[/bold yellow], [bold yellow]film_standard[/bold yellow], [bold yellow]music_light[/bold yellow], [bold yellow]music_standard[/bold yellow], [bold yellow]speech[/bold yellow].',
     'linux_thd'         : 'Linux version of DEE does not support TrueHD encoding.',
     'path'              : 'path [bold yellow]🤠[/bold yellow] does not exist.',
+    'no_input'          : 'there are no files to encode in the input(s).',
+    'track_index'       : '[bold yellow]-ti[/bold yellow]/[bold yellow]--track-index[/bold yellow] has to be a number, a comma separated list of numbers or [bold yellow]all[/bold yellow].',
+    'track_missing'     : 'there is no audio track [bold yellow]🤠[/bold yellow].',
     'ffprobe'           : 'input file couldn\'t be parsed by ffprobe, try to extract/remux it with ffmpeg or mkvmerge.',
-    'sample_mismatch'   : 'each input has to have the same sample rate:\n🤠',
-    'channel_mismatch'  : 'each input has to have the same channel count:\n🤠',
-    'bitdepth_mismatch' : 'each input has to have the same bit depth:\n🤠',
     'channels'          : 'number of input channels can only be [bold yellow]1[/bold yellow], [bold yellow]2[/bold yellow], [bold yellow]6[/bold yellow] or [bold yellow]8[/bold yellow].',
     'binary_exist'      : '[bold yellow]🤠[/bold yellow] does not exist.',
     'config_key'        : 'the following keys are missing from your config file: 🤠.\nUpdate your config file.',
-    'ac4_input_channels': 'input channels for AC4 encoding can only be [bold yellow]6[/bold yellow].'
+    'config_missing'    : 'there is no config file at [bold yellow]🤠[/bold yellow], run [bold yellow]deew[/bold yellow] once to create one.',
+    'api_native'        : 'the [bold yellow]native[/bold yellow] measure engine is only available from the command line.',
+    'api_run'           : 'jobs have to come from the last [bold yellow]plan()[/bold yellow] call and can only be run once.'
 }
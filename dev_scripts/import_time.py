@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# usage: python dev_scripts/import_time.py [budget in ms]
+# fails if importing deew.__main__ in a fresh interpreter takes longer than the budget (median of the runs)
+# or if any of the modules below get imported without a code path needing them
+budget = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+runs = 9
+lazy = ['requests', 'toml', 'xmltodict', 'packaging', 'platformdirs', 'unidecode', 'numpy', 'multiprocessing',
+        'concurrent.futures.process', 'rich.console', 'rich.progress', 'rich.prompt', 'rich.syntax', 'rich.table']
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+env = {**os.environ, 'PYTHONPATH': root, 'PYTHONDONTWRITEBYTECODE': ''}
+
+# the first run writes the bytecode cache so only the imports get measured
+modules = subprocess.run([sys.executable, '-c', 'import sys, deew.__main__; print("\\n".join(sys.modules))'],
+                         env=env, capture_output=True, encoding='utf-8', check=True).stdout.split()
+eager = [m for m in lazy if m in modules]
+
+times = []
+for _ in range(runs):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import deew.__main__'],
+                            env=env, capture_output=True, encoding='utf-8', check=True).stderr
+    times.append(int(re.search(r'\|\s*([0-9]+) \| deew\.__main__$', stderr, re.MULTILINE)[1]) / 1000)
+
+median = statistics.median(times)
+print(f'import deew.__main__: {median:.1f} ms median, {min(times):.1f} ms best of {runs} runs (budget: {budget:g} ms)')
+if eager: print(f'imported eagerly: {", ".join(eager)}')
+sys.exit(1 if median > budget or eager else 0)
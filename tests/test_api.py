@@ -0,0 +1,32 @@
+import pytest
+
+from deew.__main__ import PlanError, options_namespace, parse_list, run, simplens
+
+
+def test_numeric_bitrate():
+    args = options_namespace({'bitrate': 640})
+    assert args.bitrate == '640'
+    assert parse_list(args.bitrate) == ['640']
+
+
+def test_options_get_cli_types():
+    args = options_namespace({'bitrate': [448, 640], 'downmix': '2', 'dialnorm': -27.0, 'segments': 3, 'keeptemp': True})
+    assert parse_list(args.bitrate) == ['448', '640']
+    assert args.downmix == 2
+    assert args.dialnorm == -27
+    assert args.segments == 3
+    assert args.keeptemp is True
+    assert args.no_prompt is True
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError, match='unknown option'):
+        options_namespace({'nope': 1})
+    with pytest.raises(ValueError, match='invalid value for downmix'):
+        options_namespace({'downmix': 'stereo'})
+
+
+def test_run_without_plan(monkeypatch):
+    monkeypatch.setattr(simplens, 'api', False, raising=False)
+    with pytest.raises(PlanError, match=r'plan\(\)'):
+        run([])
@@ -0,0 +1,55 @@
+from argparse import Namespace
+from dataclasses import replace
+
+import pytest
+
+import deew.__main__ as deew
+from deew.__main__ import DeeLog, Job, dee_measures
+
+
+@pytest.fixture
+def dee_5_2(monkeypatch):
+    monkeypatch.setattr(deew.simplens, 'dee_measure_pass', True, raising=False)
+
+
+def feed(log, lines):
+    return [(log.feed(line), log.phase, log.progress) for line in lines]
+
+
+measure_pass = ['Stage progress: 50.0', 'Stage progress: 100.0', 'measured_loudness=-24.3']
+encode_pass = ['Stage progress: 40.0', 'Stage progress: 100.0']
+
+
+def test_measured_dialnorm(dee_5_2):
+    log = DeeLog(dee_measures('ddp', 0), 0.25)
+    events = feed(log, measure_pass + encode_pass)
+    assert events[0] == ('progress', 'measure', 12.5)
+    assert events[2][:2] == ('loudness', 'encode')
+    assert events[3] == ('progress', 'encode', 40.0)
+    assert log.loudness == -24.3
+    assert list(log.durations()) == ['startup', 'measure', 'encode', 'finalise']
+
+
+@pytest.mark.parametrize('aformat', ['dd', 'ddp', 'ac4', 'thd'])
+def test_cached_dialnorm_skips_measure(dee_5_2, aformat):
+    # a cached or given dialnorm goes into the XML, DEE starts encoding right away
+    log = DeeLog(dee_measures(aformat, -27), 0.25)
+    events = feed(log, encode_pass)
+    assert events[0] == ('progress', 'encode', 40.0)
+    assert list(log.durations()) == ['startup', 'encode', 'finalise']
+
+
+def test_thd_measures_without_measure_pass(monkeypatch):
+    monkeypatch.setattr(deew.simplens, 'dee_measure_pass', False, raising=False)
+    assert dee_measures('thd', 0)
+    assert not dee_measures('ddp', 0)
+
+
+def test_job_measures_with_its_dialnorm(dee_5_2, monkeypatch):
+    monkeypatch.setattr(deew, 'args', Namespace(dialnorm=0), raising=False)
+    job = Job(None, 'ddp', '', 'out.ec3', 'out.xml', [], '', {}, '0ms')
+    assert job.measures
+    # a segment gets the dialnorm of the whole input
+    assert not replace(job, dialnorm=-24).measures
+    monkeypatch.setattr(deew, 'args', Namespace(dialnorm=-31), raising=False)
+    assert not job.measures
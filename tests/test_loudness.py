@@ -0,0 +1,77 @@
+import math
+import shutil
+import wave
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from deew.loudness import channel_weights, gated_loudness, integrated_loudness, k_weighting  # noqa: E402
+
+samplerate = 48000
+# a full scale 1 kHz sine on one channel reads -3.01 LKFS
+amplitude = 10 ** ((-20 + 3.01) / 20)
+
+
+def sine(seconds, amplitude=amplitude, frequency=1000):
+    return amplitude * np.sin(2 * np.pi * frequency * np.arange(int(seconds * samplerate)) / samplerate)
+
+
+def powers(signal):
+    # the 100 ms mean squares integrated_loudness builds its blocks from
+    nfft = 1 << (len(signal) * 2 - 1).bit_length()
+    filtered = np.fft.irfft(np.fft.rfft(signal, nfft) * np.fft.rfft(k_weighting(samplerate), nfft), nfft)[:len(signal)]
+    step = samplerate // 10
+    usable = len(filtered) - len(filtered) % step
+    return np.mean(np.square(filtered[:usable]).reshape(-1, step), axis=1)[:, None]
+
+
+def gain(frequency):
+    response = np.fft.rfft(k_weighting(samplerate), samplerate)
+    return 20 * math.log10(abs(response[frequency]))
+
+
+def test_k_weighting_response():
+    # the -0.691 offset of the loudness formula cancels the gain at 1 kHz
+    assert gain(1000) == pytest.approx(0.691, abs=0.01)
+    assert gain(10000) == pytest.approx(4.0, abs=0.2)
+    assert gain(20) < -10
+
+
+def test_k_weighting_other_samplerates():
+    response = np.fft.rfft(k_weighting(44100), 44100)
+    assert 20 * math.log10(abs(response[1000])) == pytest.approx(0.691, abs=0.01)
+
+
+def test_sine_at_minus_20():
+    assert gated_loudness(powers(sine(10)), np.ones(1)) == pytest.approx(-20, abs=0.05)
+
+
+def test_relative_gate_drops_quiet_parts():
+    # 30 dB below the loud part, it's gated out by the -10 LU relative gate, only the blocks across the change are left
+    signal = np.concatenate([sine(10), sine(10, amplitude / 10 ** 1.5)])
+    assert gated_loudness(powers(signal), np.ones(1)) == pytest.approx(-20, abs=0.1)
+
+
+def test_absolute_gate():
+    assert gated_loudness(powers(np.zeros(samplerate * 5)), np.ones(1)) == -math.inf
+    assert gated_loudness(powers(sine(5, 10 ** (-80 / 20))), np.ones(1)) == -math.inf
+    # shorter than a single 400 ms block
+    assert gated_loudness(powers(sine(0.3)), np.ones(1)) == -math.inf
+
+
+def test_channel_weights():
+    assert list(channel_weights(2)) == [1, 1]
+    assert list(channel_weights(6)) == [1, 1, 1, 0, 1.41, 1.41]
+    assert list(channel_weights(8)) == [1, 1, 1, 0, 1.41, 1.41, 1.41, 1.41]
+
+
+@pytest.mark.skipif(not shutil.which('ffmpeg'), reason='needs ffmpeg')
+def test_integrated_loudness(tmp_path):
+    wav_file = tmp_path / 'tone.wav'
+    with wave.open(str(wav_file), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes((sine(10) * 32767).astype('<i2').tobytes())
+    assert integrated_loudness('ffmpeg', str(wav_file), 0, samplerate, 1) == pytest.approx(-20, abs=0.05)
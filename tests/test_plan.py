@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+import deew.__main__ as deew
+from deew.__main__ import FilePlan, Job, PlanError, encode_makespan, get_layout, options_namespace
+
+default_bitrates = {'dd_1_0': 128, 'dd_2_0': 256, 'dd_5_1': 640, 'ddp_1_0': 128, 'ddp_2_0': 256, 'ddp_5_1': 1024, 'ddp_7_1': 1536,
+                    'ac4_2_0': 320}
+
+
+@pytest.fixture
+def layout_plan(monkeypatch, tmp_path):
+    messages = []
+
+    def make(formats, downmix=None):
+        monkeypatch.setattr(deew, 'args', options_namespace({}), raising=False)
+        monkeypatch.setattr(deew.simplens, 'config', {'default_bitrates': default_bitrates, 'temp_path': str(tmp_path)}, raising=False)
+        monkeypatch.setattr(deew.simplens, 'is_nonnative_exe', False, raising=False)
+        monkeypatch.setattr(deew.simplens, 'pb', SimpleNamespace(console=SimpleNamespace(print=messages.append)), raising=False)
+        plan = SimpleNamespace(formats=formats, bitrates=[None], downmix=downmix, output=str(tmp_path), layouts={})
+        monkeypatch.setattr(deew.simplens, 'plan', plan, raising=False)
+        return messages
+    return make
+
+
+def source(channels):
+    return {'samplerate': 48000, 'channels': channels, 'bit_depth': 24}
+
+
+def test_downmix_only_applies_to_more_channels(layout_plan):
+    layout_plan(['ddp'], downmix=2)
+    assert [d[2:] for d in get_layout(source(6)).deliverables] == [(2, 'stereo')]
+    assert [d[2:] for d in get_layout(source(2)).deliverables] == [(2, 'off')]
+    assert [d[2:] for d in get_layout(source(1)).deliverables] == [(1, 'off')]
+
+
+def test_formats_a_layout_cant_make_are_skipped(layout_plan):
+    messages = layout_plan(['ddp', 'ac4', 'thd'])
+    assert [d[0] for d in get_layout(source(6)).deliverables] == ['ddp', 'ac4', 'thd']
+    assert [d[0] for d in get_layout(source(2)).deliverables] == ['ddp', 'thd']
+    assert [d[0] for d in get_layout(source(1)).deliverables] == ['ddp']
+    assert any('AC4' in m and 'TrueHD' in m for m in messages)
+
+
+def test_nothing_to_encode(layout_plan):
+    messages = layout_plan(['ac4'])
+    assert get_layout(source(2)).deliverables == []
+    assert 'nothing to encode' in messages[0]
+
+
+def test_unsupported_channels(layout_plan):
+    layout_plan(['ddp'])
+    with pytest.raises(PlanError):
+        get_layout(source(4))
+
+
+def file_plan(*jobs):
+    # (cost, segments) of every job
+    return FilePlan('in.wav', sum(cost for cost, _ in jobs), [cost for cost, _ in jobs],
+                    [], [Job(None, 'ddp', '', '', '', [], '', {}, '+0ms', segments) for _, segments in jobs], None, False, 0)
+
+
+def test_encode_makespan():
+    # 600 s of 5.1 audio at 60x with a 2 s start is 12 s
+    assert encode_makespan([file_plan((600, 1))], 1, 60, 2) == 12
+    assert encode_makespan([file_plan((600, 1), (600, 1))], 2, 60, 2) == 12
+    assert encode_makespan([file_plan((600, 1), (600, 1))], 1, 60, 2) == 24
+    # the segments of a job run side by side, each of them starts DEE
+    assert encode_makespan([file_plan((600, 3))], 3, 60, 2) == pytest.approx(2 + 10 / 3)
+
+
+def test_given_dialnorm(monkeypatch):
+    monkeypatch.setattr(deew, 'args', options_namespace({'dialnorm': -27}), raising=False)
+    monkeypatch.setattr(deew.simplens, 'dee_measure_pass', True, raising=False)
+    ddp, ac4 = (Job(None, aformat, '', '', '', [], '', {}, '+0ms') for aformat in ['ddp', 'ac4'])
+    assert (ddp.given_dialnorm, ddp.measures) == (-27, False)
+    assert (ac4.given_dialnorm, ac4.measures) == (0, True)
+    assert Job(None, 'ddp', '', '', '', [], '', {}, '+0ms', dialnorm=-24).given_dialnorm == -24
@@ -0,0 +1,92 @@
+import wave
+from argparse import Namespace
+from types import SimpleNamespace
+
+import pytest
+
+import deew.__main__ as deew
+from deew.__main__ import Intermediate, Job, Segment, Splice, access_units, splice_segments, split_job
+
+
+def ac3_frame(tag: int) -> bytes:
+    # 48 kHz, 64 words, bsid 8
+    return b'\x0b\x77\x00\x00\x00\x40' + bytes([tag]) * 122
+
+
+def eac3_frame(tag: int, dependent: bool = False) -> bytes:
+    # 100 words, 6 blocks, bsid 16
+    words = 100
+    return bytes([0x0b, 0x77, (0x40 if dependent else 0x00) | (words - 1) >> 8, (words - 1) & 0xff, 0x30, 0x80]) + bytes([tag]) * (words * 2 - 6)
+
+
+def test_ac3_units():
+    data = b''.join(ac3_frame(n) for n in range(3))
+    assert access_units(data) == [(0, 1536), (128, 1536), (256, 1536)]
+
+
+def test_eac3_dependent_substreams_stay_with_their_frame():
+    data = eac3_frame(0) + eac3_frame(0, dependent=True) + eac3_frame(1) + eac3_frame(1, dependent=True)
+    assert access_units(data) == [(0, 1536), (400, 1536)]
+
+
+def test_lost_sync():
+    with pytest.raises(ValueError, match='lost sync'):
+        access_units(ac3_frame(0) + b'\x00' * 128)
+
+
+def test_only_48k_ac3():
+    frame = bytearray(ac3_frame(0))
+    frame[4] = 0x40
+    with pytest.raises(ValueError, match='48 kHz'):
+        access_units(bytes(frame))
+
+
+def test_splice_drops_preroll_and_overlap(tmp_path, monkeypatch):
+    monkeypatch.setattr(deew, 'args', Namespace(keeptemp=False), raising=False)
+    splice = Splice(str(tmp_path / 'out.ac3'), [], 2)
+    # frames 0-5 and 4-9 of the same audio, each segment keeps its own half
+    for n, (first, skip, keep) in enumerate([(0, 0, 5), (3, 2, None)]):
+        part = tmp_path / f'part{n}.ac3'
+        part.write_bytes(b''.join(ac3_frame(tag) for tag in range(first, first + 7)))
+        splice.segments.append(Segment(first * 1536, None, skip * 1536, None if keep is None else keep * 1536, str(part), splice))
+    splice_segments(splice)
+    data = (tmp_path / 'out.ac3').read_bytes()
+    assert [data[start + 6] for start, _ in access_units(data)] == list(range(10))
+    assert not (tmp_path / 'part0.ac3').exists()
+
+
+@pytest.fixture
+def intermediate(tmp_path):
+    wav_file = tmp_path / 'in.wav'
+    with wave.open(str(wav_file), 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(48000)
+        wav.writeframes(b'\x00' * 4 * 1536 * 300)
+    return Intermediate(str(wav_file), 0, 'key', str(wav_file), 9.6, [], '', True, consumers=1)
+
+
+def test_split_job(tmp_path, monkeypatch, intermediate):
+    temp_path = str(tmp_path / 'temp')
+    monkeypatch.setattr(deew.simplens, 'config', {'temp_path': temp_path}, raising=False)
+    monkeypatch.setattr(deew.simplens, 'plan', SimpleNamespace(dee_xml_input_base=f'{temp_path}/'), raising=False)
+    monkeypatch.setattr(deew.simplens, 'is_nonnative_exe', False, raising=False)
+    xml_base = {'job_config': {'output': {'ec3': {'storage': {'local': {'path': '"out"'}}}}}}
+    job = Job(intermediate, 'ddp', '/out', 'in.ec3', f'{temp_path}/in.key.xml', ['dee', '-x', f'{temp_path}/in.key.xml', '--disable-xml-validation'],
+              '', xml_base, '+0ms', segments=3)
+
+    jobs = split_job(job, -24)
+    roll, frame = 64 * 1536, 1536
+    assert [(j.segment.start, j.segment.end, j.segment.skip, j.segment.keep) for j in jobs] == [
+        (0, 100 * frame + roll, 0, 100 * frame),
+        (100 * frame - roll, 200 * frame + roll, roll, 100 * frame),
+        (200 * frame - roll, None, roll, None),
+    ]
+    assert [j.out_name for j in jobs] == ['in.part1.ec3', 'in.part2.ec3', 'in.part3.ec3']
+    assert jobs[1].dee_args == ['dee', '-x', f'{temp_path}/in.key.part2.xml', '--disable-xml-validation']
+    assert all(j.dialnorm == -24 and j.output == temp_path for j in jobs)
+    assert jobs[0].segment.splice.output == '/out/in.ec3'
+    assert jobs[0].xml_base['job_config']['output']['ec3']['storage']['local']['path'] == f'"{temp_path}"'
+    # the original XML base is shared with the other jobs of the input
+    assert xml_base['job_config']['output']['ec3']['storage']['local']['path'] == '"out"'
+    assert intermediate.consumers == 3
@@ -0,0 +1,110 @@
+import shutil
+import threading
+import time
+from argparse import Namespace
+
+import pytest
+
+import deew.__main__ as deew
+from deew.__main__ import FilePlan, Intermediate, Job, PlanError, TempTier, admit, link_input, prepare, release, settle
+
+
+@pytest.fixture
+def tiers(tmp_path, monkeypatch):
+    ram, temp = tmp_path / 'ram', tmp_path / 'temp'
+    ram.mkdir()
+    temp.mkdir()
+    tiers = [TempTier(str(ram), 0, 1000), TempTier(str(temp), 0)]
+    monkeypatch.setattr(deew.simplens, 'temp_tiers', tiers, raising=False)
+    monkeypatch.setattr(deew.simplens, 'temp_cond', threading.Condition(), raising=False)
+    monkeypatch.setattr(deew.simplens, 'temp_releasable', True, raising=False)
+    return tiers
+
+
+def file_plan(tmp_path, size, name='in'):
+    wav_file = str(tmp_path / 'temp' / f'{name}.key.wav')
+    intermediate = Intermediate(f'/media/{name}.mkv', 0, 'key', wav_file, 60, ['-f', 'wav', wav_file], '', False, size=size)
+    return FilePlan(f'/media/{name}.mkv', 60, [60], [intermediate], [], None, False, size)
+
+
+def test_admit_picks_the_first_tier_that_fits(tmp_path, tiers):
+    small = file_plan(tmp_path, 600, 'small')
+    assert admit(small) is tiers[0]
+    assert (tiers[0].pending, tiers[0].live) == (600, 600)
+    # the output of the decode is moved along with the tier
+    assert small.intermediates[0].wav_file == str(tmp_path / 'ram' / 'small.key.wav')
+    assert small.intermediates[0].output_args[-1] == small.intermediates[0].wav_file
+
+    # the RAM budget is taken, the next one goes to the temp path
+    assert admit(file_plan(tmp_path, 600, 'next')) is tiers[1]
+
+    settle(tiers[0], 600)
+    assert (tiers[0].pending, tiers[0].live) == (0, 600)
+    release(small.intermediates[0])
+    assert tiers[0].live == 0
+
+
+def test_existing_intermediates_take_no_space(tmp_path, tiers):
+    plan = file_plan(tmp_path, 600)
+    plan.intermediates[0].exists = True
+    assert admit(plan) is None
+    assert tiers[0].live == 0
+
+
+def test_admit_fails_when_nothing_can_be_freed(tmp_path, tiers):
+    tiers[1].reserve = shutil.disk_usage(tiers[1].path).free
+    with pytest.raises(PlanError) as e:
+        admit(file_plan(tmp_path, 2000))
+    assert e.value.args[0] == 'temp_space'
+
+
+def test_admit_waits_for_a_release(tmp_path, tiers):
+    tiers[1].reserve = shutil.disk_usage(tiers[1].path).free
+    first = file_plan(tmp_path, 800, 'first')
+    admit(first)
+    settle(tiers[0], 800)
+    threading.Timer(0.2, release, args=(first.intermediates[0],)).start()
+    started = time.monotonic()
+    assert admit(file_plan(tmp_path, 800, 'second')) is tiers[0]
+    assert time.monotonic() - started >= 0.2
+
+
+def test_failed_measurement_releases_the_intermediate(tmp_path, tiers, monkeypatch):
+    monkeypatch.setattr(deew, 'args', Namespace(dialnorm=0), raising=False)
+    monkeypatch.setattr(deew.simplens, 'pb', deew.NullProgress(), raising=False)
+    monkeypatch.setattr(deew.simplens, 'device_lock', threading.Lock(), raising=False)
+
+    def measure(task_id, job):
+        raise RuntimeError('DEE didn\'t report the loudness')
+    monkeypatch.setattr(deew, 'measure', measure)
+
+    plan = file_plan(tmp_path, 600)
+    intermediate = plan.intermediates[0]
+    plan.jobs.append(Job(intermediate, 'ddp', '/out', 'in.ec3', 'in.xml', [], '', {}, '+0ms', segments=2))
+    # stands in for the decode
+    open(intermediate.output_args[-1].replace('temp', 'ram'), 'wb').close()
+
+    with pytest.raises(RuntimeError):
+        prepare(plan, [])
+    assert (tiers[0].pending, tiers[0].live) == (0, 0)
+    assert not (tmp_path / 'ram' / 'in.key.wav').exists()
+    assert not plan.jobs[0].queued
+
+
+def test_borrowed_inputs_are_linked(tmp_path, monkeypatch):
+    monkeypatch.setattr(deew.simplens, 'is_nonnative_exe', False, raising=False)
+    (tmp_path / 'in.wav').write_bytes(b'RIFF')
+    assert link_input(str(tmp_path / 'in.wav'), str(tmp_path / 'in.key.wav')) == str(tmp_path / 'in.key.input.wav')
+    assert (tmp_path / 'in.key.input.wav').read_bytes() == b'RIFF'
+
+
+def test_unreachable_inputs_are_not_borrowed(tmp_path, monkeypatch):
+    def link(*args):
+        raise OSError('cross-device link')
+    monkeypatch.setattr(deew.os, 'link', link)
+    monkeypatch.setattr(deew.simplens, 'is_nonnative_exe', False, raising=False)
+    assert link_input('/media/in.wav', str(tmp_path / 'in.key.wav')) == '/media/in.wav'
+    # a Windows DEE under WSL can't read it, it has to be decoded into the temp path
+    monkeypatch.setattr(deew.simplens, 'is_nonnative_exe', True, raising=False)
+    assert link_input('/media/in.wav', str(tmp_path / 'in.key.wav')) is None
+    assert link_input('/mnt/d/in.wav', str(tmp_path / 'in.key.wav')) == '/mnt/d/in.wav'